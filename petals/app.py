@@ -1,22 +1,30 @@
 from sanic import Sanic
-from sanic.response import json, file
+from sanic.response import json, raw
 import asyncio
 import torch
 import os
-import ipfshttpclient
+import aiohttp
 import io
-import base64
+import pybase64
 from PIL import Image
 import aiofiles
 import time
+import codecs
+import re
+import contextlib
+import functools
+import hmac
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from petals.wallet import WalletManager
+from petals.wallet import WalletManager, start_verify_pool, shutdown_verify_pool
 from petals.config import Config
+from petals.ipfs_api import AsyncIPFSAPIClient, multiaddr_to_api_url
 
 # Petals for distributed text generation
 from petals import AutoDistributedModelForCausalLM
-from transformers import AutoTokenizer
+from transformers import AutoTokenizer, BatchEncoding
 
 # Diffusers for image generation
 from diffusers import StableDiffusionPipeline
@@ -28,15 +36,68 @@ config = Config()
 
 # Configuration variables
 TEXT_MODEL_NAME = config.get("text_model.name", "bigscience/bloom-petals")
+TEXT_MODEL_DEVICE = config.get("text_model.device", "cpu")
+TEXT_MODEL_DTYPE = config.get("text_model.dtype", "bfloat16")
+TEXT_SESSION_CACHE_SIZE = config.get("text_model.session_cache_size", 32)
+TEXT_SESSION_MAX_LENGTH = config.get("text_model.session_max_length", 1024)
+TEXT_MAX_BATCH_SIZE = config.get("text_model.max_batch_size", 8)
+TEXT_BATCH_WINDOW = config.get("text_model.batch_window_ms", 20) / 1000
+TEXT_REQUEST_TIMEOUT = config.get("text_model.request_timeout", 600)
 IMAGE_MODEL_NAME = config.get("image_model.name", "runwayml/stable-diffusion-v1-5")
+IMAGE_MODEL_QUANTIZATION = config.get("image_model.quantization", "none")
+IMAGE_MODEL_COMPILE = config.get("image_model.compile", True)
+IMAGE_RESPONSE_FORMAT = config.get("image_model.response_format", "webp")
 IPFS_API = config.get("ipfs.api", "/ip4/127.0.0.1/tcp/5001")
+PEERS_CACHE_TTL = 5
+REQUIRE_WALLET = config.get("security.require_wallet", True)
+SERVER_WORKERS = config.get("server.workers", 1)
+# Wallet state, config reloads and Petals sessions live in each worker process, so
+# wallets only work with a single worker
+MULTI_WORKER_WALLET_ERROR = "Wallets need server.workers = 1, wallet state is not shared between workers"
 CACHE_DIR = "./cache"
 
+# PIL save options per output format, tuned for encode speed
+IMAGE_ENCODERS = {
+    "png": {"format": "PNG", "compress_level": 1},
+    "webp": {"format": "WEBP", "quality": 90, "method": 0}
+}
+
+# Content types of binary IPFS objects, detected from their leading bytes
+BINARY_SIGNATURES = {
+    b"\x89PNG": "image/png",
+    b"\xff\xd8": "image/jpeg",
+    b"GIF8": "image/gif",
+    b"%PDF": "application/pdf"
+}
+
+def sniff_content_type(data):
+    """Content type of binary data from its leading bytes, None if not recognized"""
+    # RIFF is also the container of WAV and AVI, WebP is marked at offset 8
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return next((ctype for magic, ctype in BINARY_SIGNATURES.items() if data.startswith(magic)), None)
+
 # Global variables
 text_model = None
 text_tokenizer = None
 image_model = None
 ipfs_client = None
+http_session = None
+
+# Reusable pinned host buffers for copying token tensors to the GPU
+pinned_buffers = {}
+# Open Petals inference sessions keyed by instance ID, least recently used first
+text_sessions = OrderedDict()
+
+# Last Petals peers info fetched from the DHT, refreshed in the background
+peers_cache = {"info": None, "fetched_at": 0.0, "refresh": None}
+
+# Pending /generate/text requests, drained in batches by text_batching_worker
+TextRequest = namedtuple("TextRequest", ["prompt", "session_key", "max_length", "temperature", "future"])
+text_queue = None
+# Model calls run on one thread per model, off the event loop
+text_executor = ThreadPoolExecutor(max_workers=1)
+image_executor = ThreadPoolExecutor(max_workers=1)
 
 # Wallet manager instance
 wallet_manager = WalletManager()
@@ -44,8 +105,28 @@ wallet_manager = WalletManager()
 # Create cache directory if it doesn't exist
 Path(CACHE_DIR).mkdir(parents=True, exist_ok=True)
 
+def get_worker_index():
+    """Get the index of this Sanic worker process (0 when running a single process)"""
+    match = re.search(r"-(\d+)-\d+$", os.environ.get("SANIC_WORKER_NAME", ""))
+    return int(match.group(1)) if match else 0
+
 @app.listener('before_server_start')
 async def setup_services(app, loop):
+    global http_session, text_queue
+    # Shared HTTP session for IPFS API calls
+    http_session = aiohttp.ClientSession()
+
+    # Coalesce concurrent text generation requests
+    text_queue = asyncio.Queue()
+    start_text_batching()
+
+    # Wallet signatures are recovered on a small thread pool
+    start_verify_pool()
+
+    # Spread workers over the available GPUs before any model is placed on one
+    if torch.cuda.is_available():
+        torch.cuda.set_device(get_worker_index() % torch.cuda.device_count())
+
     # Start loading models in background
     app.ctx.text_model_loading = asyncio.create_task(load_text_model())
     app.ctx.image_model_loading = asyncio.create_task(load_image_model())
@@ -54,30 +135,144 @@ async def setup_services(app, loop):
     # Wait for IPFS to connect (but don't wait for models to fully load)
     await app.ctx.ipfs_loading
 
+@app.listener('after_server_stop')
+async def close_services(app, loop):
+    if http_session is not None:
+        await http_session.close()
+    shutdown_verify_pool()
+    # Write out any wallet changes still waiting for their timer
+    wallet_manager.flush()
+
+def resolve_text_dtype(name):
+    """torch_dtype to load the text model with, from the text_model.dtype setting"""
+    if name == "auto":
+        return "auto"
+    dtype = getattr(torch, name, None) if isinstance(name, str) else None
+    if not isinstance(dtype, torch.dtype):
+        raise ValueError(f"Invalid text_model.dtype {name!r}, expected 'auto' or a torch dtype such as 'bfloat16'")
+    return dtype
+
 async def load_text_model():
     global text_model, text_tokenizer
     try:
         print("Loading BLOOM model via Petals (this may take a minute)...")
         text_tokenizer = AutoTokenizer.from_pretrained(TEXT_MODEL_NAME)
-        text_model = AutoDistributedModelForCausalLM.from_pretrained(TEXT_MODEL_NAME)
+        # Batched prompts are padded on the left so generation continues right after them
+        text_tokenizer.padding_side = "left"
+        # BF16 halves the local weights without FP16's overflow issues on BLOOM
+        model = AutoDistributedModelForCausalLM.from_pretrained(
+            TEXT_MODEL_NAME,
+            torch_dtype=resolve_text_dtype(TEXT_MODEL_DTYPE),
+            low_cpu_mem_usage=True
+        )
+
+        # Only the embeddings and LM head run locally, the transformer blocks are
+        # served remotely, so keep the per-token local work on the GPU when asked to
+        if TEXT_MODEL_DEVICE.startswith("cuda") and torch.cuda.is_available():
+            model = model.to(TEXT_MODEL_DEVICE)
+
+        text_model = model
         print("Text model loaded successfully!")
     except Exception as e:
         print(f"Error loading text model: {e}")
 
+def quantization_unavailable(method):
+    """Why a quantization method can't be used with the installed packages (None if it can)"""
+    try:
+        if method == "nf4":
+            import bitsandbytes
+            from diffusers import BitsAndBytesConfig  # diffusers>=0.31
+        elif method in ("int8_wo", "fp8_wo"):
+            from torchao.quantization import quantize_  # torchao needs torch>=2.3
+        else:
+            return "unknown method"
+    except Exception as e:
+        # Missing packages raise ImportError, a torchao/torch version mismatch can fail
+        # with other errors while importing
+        return f"{type(e).__name__}: {e}"
+    return None
+
+def load_nf4_unet():
+    """Load the U-Net with bitsandbytes NF4 weights for memory-limited GPUs"""
+    from diffusers import BitsAndBytesConfig, UNet2DConditionModel
+
+    return UNet2DConditionModel.from_pretrained(
+        IMAGE_MODEL_NAME,
+        subfolder="unet",
+        revision="fp16",
+        torch_dtype=torch.float16,
+        quantization_config=BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_compute_dtype=torch.float16
+        )
+    )
+
+def quantize_unet(unet, method):
+    """Apply torchao weight-only quantization to the U-Net's linear layers in place"""
+    from torchao.quantization import quantize_, int8_weight_only, float8_weight_only
+
+    if method == "int8_wo":
+        quantize_(unet, int8_weight_only())
+    elif method == "fp8_wo":
+        quantize_(unet, float8_weight_only())
+    else:
+        raise ValueError(f"Unsupported image model quantization: {method}")
+
+def warmup_image_model(pipeline):
+    """Run one generation at the default resolution so compiled graphs are ready"""
+    with torch.inference_mode(), torch.autocast("cuda"):
+        pipeline(
+            prompt="warmup",
+            height=512,
+            width=512,
+            num_inference_steps=2,
+            guidance_scale=7.5
+        )
+
 async def load_image_model():
     global image_model
     try:
         print("Loading Stable Diffusion model (this may take a minute)...")
+        quantization = IMAGE_MODEL_QUANTIZATION
+        if quantization in ("fp8_wo", "nf4") and not torch.cuda.is_available():
+            print(f"Quantization '{quantization}' requires CUDA, loading unquantized weights")
+            quantization = "none"
+        if quantization != "none":
+            reason = quantization_unavailable(quantization)
+            if reason is not None:
+                print(f"Warning: quantization '{quantization}' is unavailable ({reason}), loading unquantized weights")
+                quantization = "none"
+
+        # NF4 has to be applied while the U-Net weights are loaded
+        pipeline_kwargs = {}
+        if quantization == "nf4":
+            pipeline_kwargs["unet"] = load_nf4_unet()
+
         # Load in fp16 precision to save memory
-        image_model = StableDiffusionPipeline.from_pretrained(
+        pipeline = StableDiffusionPipeline.from_pretrained(
             IMAGE_MODEL_NAME,
             torch_dtype=torch.float16,
-            revision="fp16"
+            revision="fp16",
+            **pipeline_kwargs
         )
+
+        # Quantize U-Net linear weights only; norms and biases stay in fp16
+        if quantization not in ("none", "nf4"):
+            quantize_unet(pipeline.unet, quantization)
         
         # Move to GPU if available
         if torch.cuda.is_available():
-            image_model = image_model.to("cuda")
+            pipeline = pipeline.to("cuda")
+
+            # Compile the U-Net (and VAE decoder) and pay the compile cost before serving
+            if IMAGE_MODEL_COMPILE:
+                pipeline.unet = torch.compile(pipeline.unet, mode="reduce-overhead", fullgraph=False)
+                pipeline.vae.decoder = torch.compile(pipeline.vae.decoder, mode="reduce-overhead", fullgraph=False)
+                print("Warming up compiled image model...")
+                await asyncio.get_running_loop().run_in_executor(image_executor, warmup_image_model, pipeline)
+
+        image_model = pipeline
         print("Image model loaded successfully!")
     except Exception as e:
         print(f"Error loading image model: {e}")
@@ -86,12 +281,198 @@ async def connect_to_ipfs():
     global ipfs_client
     try:
         print("Connecting to IPFS daemon...")
-        ipfs_client = ipfshttpclient.connect(IPFS_API)
+        client = AsyncIPFSAPIClient(http_session, multiaddr_to_api_url(IPFS_API))
+        if not await client.connect():
+            raise ConnectionError(f"IPFS API at {IPFS_API} is not reachable")
+        ipfs_client = client
         print(f"Connected to IPFS daemon: {ipfs_client.id()['ID']}")
     except Exception as e:
         print(f"Error connecting to IPFS: {e}")
         print("IPFS functionality will be disabled")
 
+def to_model_device(inputs):
+    """Move tokenizer output to the text model's device, staging CUDA copies through pinned memory"""
+    device = getattr(text_model, "device", None)
+    if device is None or device.type == "meta":
+        return inputs
+    if device.type != "cuda":
+        return inputs.to(device)
+    
+    for name, tensor in inputs.items():
+        buffer = pinned_buffers.get(name)
+        if buffer is None or buffer.dtype != tensor.dtype or buffer.numel() < tensor.numel():
+            buffer = torch.empty(max(tensor.numel(), 1024), dtype=tensor.dtype, pin_memory=True)
+            pinned_buffers[name] = buffer
+        staged = buffer[:tensor.numel()].view(tensor.shape)
+        staged.copy_(tensor)
+        inputs[name] = staged.to(device, non_blocking=True)
+    return inputs
+
+def close_text_session(entry):
+    """Close a cached Petals inference session"""
+    stack, _ = entry
+    stack.close()
+
+def generate_text_tokens(session_key, inputs, **generate_kwargs):
+    """
+    Generate a continuation of the tokenized prompt and return the full token sequence.
+    
+    When a session key is given, the Petals inference session (and with it the
+    attention caches on the servers) is kept open and reused by the next request
+    whose prompt extends the tokens the session has already processed.
+    """
+    max_length = generate_kwargs["max_length"]
+    if session_key is None or max_length > TEXT_SESSION_MAX_LENGTH:
+        with torch.inference_mode():
+            outputs = text_model.generate(**to_model_device(inputs), **generate_kwargs)
+        return outputs[0]
+    
+    input_ids = inputs["input_ids"]
+    # Reuse the cached session only if the prompt extends what it has processed
+    entry = text_sessions.pop(session_key, None)
+    n_prev_tokens = 0
+    if entry is not None:
+        prev_ids = entry[1].output_ids
+        n_prev_tokens = prev_ids.shape[1] if prev_ids is not None else 0
+        if not (0 < n_prev_tokens < input_ids.shape[1]
+                and torch.equal(input_ids[:, :n_prev_tokens], prev_ids.cpu())):
+            close_text_session(entry)
+            entry = None
+            n_prev_tokens = 0
+    
+    if entry is None:
+        stack = contextlib.ExitStack()
+        session = stack.enter_context(text_model.inference_session(max_length=TEXT_SESSION_MAX_LENGTH))
+        entry = (stack, session)
+    
+    try:
+        with torch.inference_mode():
+            # Only the new tokens are sent, the session already holds the previous ones
+            text_model.generate(
+                **to_model_device(BatchEncoding({"input_ids": input_ids[:, n_prev_tokens:]})),
+                session=entry[1],
+                **generate_kwargs
+            )
+    except Exception:
+        close_text_session(entry)
+        raise
+    
+    text_sessions[session_key] = entry
+    while len(text_sessions) > TEXT_SESSION_CACHE_SIZE:
+        _, evicted = text_sessions.popitem(last=False)
+        close_text_session(evicted)
+    
+    return entry[1].output_ids[0]
+
+def run_text_batch(requests):
+    """Generate text for requests sharing the same sampling settings"""
+    generate_kwargs = {
+        "max_length": requests[0].max_length,
+        "temperature": requests[0].temperature,
+        "do_sample": True,
+        "pad_token_id": text_tokenizer.eos_token_id
+    }
+    
+    if len(requests) == 1:
+        request = requests[0]
+        inputs = text_tokenizer(request.prompt, return_tensors="pt")
+        output_ids = generate_text_tokens(request.session_key, inputs, **generate_kwargs)
+        return [text_tokenizer.decode(output_ids, skip_special_tokens=True)]
+    
+    inputs = text_tokenizer([request.prompt for request in requests], padding=True, return_tensors="pt")
+    with torch.inference_mode():
+        outputs = text_model.generate(**to_model_device(inputs), **generate_kwargs)
+    return text_tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+def start_text_batching():
+    """Start the text batching worker, restarted if it ever dies"""
+    app.ctx.text_batching = asyncio.create_task(text_batching_worker())
+    app.ctx.text_batching.add_done_callback(restart_text_batching)
+
+def restart_text_batching(task):
+    if task.cancelled():
+        return
+    print(f"Text batching worker stopped ({task.exception()!r}), restarting it")
+    start_text_batching()
+
+def group_text_requests(batch):
+    """Requests continuing a cached session run alone, the rest are grouped by sampling settings"""
+    groups = {}
+    for request in batch:
+        if request.future.cancelled():
+            continue
+        try:
+            if request.session_key in text_sessions:
+                groups[("session", id(request))] = [request]
+            else:
+                groups.setdefault((request.max_length, request.temperature), []).append(request)
+        except Exception as e:
+            # Only the request with unusable settings fails, not the others in its batch
+            request.future.set_exception(e)
+    return groups.values()
+
+def fail_text_requests(requests, error):
+    for request in requests:
+        if not request.future.done():
+            request.future.set_exception(error)
+
+async def text_batching_worker():
+    """Collect concurrent text requests and run them through the model together"""
+    loop = asyncio.get_running_loop()
+    while True:
+        # Wait for a request, then gather whatever else arrives within the batch window
+        batch = [await text_queue.get()]
+        deadline = loop.time() + TEXT_BATCH_WINDOW
+        while len(batch) < TEXT_MAX_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(text_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        try:
+            groups = group_text_requests(batch)
+        except Exception as e:
+            fail_text_requests(batch, e)
+            continue
+        
+        for group in groups:
+            try:
+                texts = await loop.run_in_executor(text_executor, run_text_batch, group)
+            except Exception as e:
+                fail_text_requests(group, e)
+            else:
+                for request, text in zip(group, texts):
+                    if not request.future.done():
+                        request.future.set_result(text)
+
+async def refresh_peers_info():
+    """Fetch Petals peers info from the DHT without blocking the event loop"""
+    info = await asyncio.get_running_loop().run_in_executor(None, text_model.get_peers_info)
+    peers_cache["info"] = info
+    peers_cache["fetched_at"] = time.monotonic()
+    return info
+
+def report_peers_refresh(task):
+    """Log failures of background peers info refreshes"""
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error refreshing peers info: {task.exception()}")
+
+async def get_peers_info():
+    """Get Petals peers info, serving cached data while a stale entry is refreshed"""
+    if peers_cache["info"] is None:
+        return await refresh_peers_info()
+    
+    refresh = peers_cache["refresh"]
+    stale = time.monotonic() - peers_cache["fetched_at"] > PEERS_CACHE_TTL
+    if stale and (refresh is None or refresh.done()):
+        refresh = asyncio.create_task(refresh_peers_info())
+        refresh.add_done_callback(report_peers_refresh)
+        peers_cache["refresh"] = refresh
+    return peers_cache["info"]
+
 @app.route("/hello", methods=["GET"])
 async def hello(request):
     return json({"message": "Hello from Petals-IPFS Microservice!"})
@@ -102,7 +483,7 @@ async def status(request):
         "text_model": {
             "name": TEXT_MODEL_NAME,
             "loaded": text_model is not None,
-            "peers": len(text_model.get_peers_info()) if text_model else 0
+            "peers": len(await get_peers_info()) if text_model else 0
         },
         "image_model": {
             "name": IMAGE_MODEL_NAME,
@@ -111,10 +492,10 @@ async def status(request):
         },
         "ipfs": {
             "connected": ipfs_client is not None,
-            "peer_id": ipfs_client.id()["ID"] if ipfs_client else None
+            "peer_id": ipfs_client.node_id if ipfs_client else None
         },
         "wallets": {
-            "registered_instances": len(wallet_manager.wallets)
+            "registered_instances": wallet_manager.instance_count
         }
     })
 
@@ -127,10 +508,10 @@ async def generate_text(request):
         return json({"error": "Text model is still loading"}, status=503)
     
     # Wallet check if required
-    if config.get("security.require_wallet", True):
-        instance_id = request.headers.get("X-Instance-ID")
-        if not instance_id or not wallet_manager.verify_instance(instance_id):
-            return json({"error": "Unauthorized: Invalid or missing instance ID"}, status=401)
+    instance_id = request.headers.get("X-Instance-ID")
+    verified = bool(instance_id) and wallet_manager.verify_instance(instance_id)
+    if REQUIRE_WALLET and not verified:
+        return json({"error": "Unauthorized: Invalid or missing instance ID"}, status=401)
     
     # Get the prompt from the request
     data = request.json
@@ -142,25 +523,29 @@ async def generate_text(request):
     temperature = data.get("temperature", 0.7)
     store_on_ipfs = data.get("store_on_ipfs", False)
     
+    # Requests are batched together, so bad values must not reach the model
+    if not isinstance(prompt, str) or not prompt:
+        return json({"error": "prompt must be a non-empty string"}, status=400)
+    if type(max_length) is not int or not 1 <= max_length <= TEXT_SESSION_MAX_LENGTH:
+        return json({"error": f"max_length must be an integer between 1 and {TEXT_SESSION_MAX_LENGTH}"}, status=400)
+    if type(temperature) not in (int, float) or not 0 < temperature <= 100:
+        return json({"error": "temperature must be a number greater than 0 and at most 100"}, status=400)
+    temperature = float(temperature)
+    
     try:
-        # Generate text using the BLOOM model
-        inputs = text_tokenizer(prompt, return_tensors="pt")
-        
-        # Move inputs to the same device as the model
-        inputs = {k: v.to(text_model.device) for k, v in inputs.items()}
-        
-        # Generate the response
-        with torch.no_grad():
-            outputs = text_model.generate(
-                **inputs,
-                max_length=max_length,
-                temperature=temperature,
-                do_sample=True,
-                pad_token_id=text_tokenizer.eos_token_id
-            )
-        
-        # Decode the generated text
-        generated_text = text_tokenizer.decode(outputs[0], skip_special_tokens=True)
+        # Generate text using the BLOOM model, batched with concurrent requests
+        future = asyncio.get_running_loop().create_future()
+        await text_queue.put(TextRequest(
+            prompt,
+            instance_id if verified else None,
+            max_length,
+            temperature,
+            future
+        ))
+        try:
+            generated_text = await asyncio.wait_for(future, TEXT_REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            return json({"error": "Text generation timed out"}, status=504)
         
         response = {
             "prompt": prompt,
@@ -170,7 +555,7 @@ async def generate_text(request):
         
         # Store on IPFS if requested and IPFS is connected
         if store_on_ipfs and ipfs_client:
-            ipfs_hash = ipfs_client.add_str(generated_text)
+            ipfs_hash = await ipfs_client.add_str(generated_text)
             response["ipfs_hash"] = ipfs_hash
             response["ipfs_gateway_url"] = f"https://ipfs.io/ipfs/{ipfs_hash}"
         
@@ -178,6 +563,19 @@ async def generate_text(request):
     except Exception as e:
         return json({"error": str(e)}, status=500)
 
+def render_image(image_format, as_base64=True, **pipeline_kwargs):
+    """Generate an image using Stable Diffusion and return its encoded bytes and base64 string (None if not requested)"""
+    with torch.inference_mode(), torch.autocast("cuda" if torch.cuda.is_available() else "cpu"):
+        image = image_model(**pipeline_kwargs).images[0]
+    
+    # Encode the image once and reuse the bytes for the file and the response
+    buffered = io.BytesIO()
+    image.save(buffered, **IMAGE_ENCODERS[image_format])
+    image_bytes = buffered.getvalue()
+    if not as_base64:
+        return image_bytes, None
+    return image_bytes, pybase64.b64encode(image_bytes).decode("ascii")
+
 @app.route("/generate/image", methods=["POST"])
 async def generate_image(request):
     global image_model
@@ -187,7 +585,7 @@ async def generate_image(request):
         return json({"error": "Image model is still loading"}, status=503)
     
     # Wallet check if required
-    if config.get("security.require_wallet", True):
+    if REQUIRE_WALLET:
         instance_id = request.headers.get("X-Instance-ID")
         if not instance_id or not wallet_manager.verify_instance(instance_id):
             return json({"error": "Unauthorized: Invalid or missing instance ID"}, status=401)
@@ -204,43 +602,65 @@ async def generate_image(request):
     num_inference_steps = data.get("num_inference_steps", 50)
     guidance_scale = data.get("guidance_scale", 7.5)
     store_on_ipfs = data.get("store_on_ipfs", False)
+    save_local = data.get("save_local", True)
+    image_format = data.get("image_format", IMAGE_RESPONSE_FORMAT)
+    if not isinstance(image_format, str) or image_format.lower() not in IMAGE_ENCODERS:
+        return json({"error": f"Unsupported image format: {image_format!r}"}, status=400)
+    image_format = image_format.lower()
+    
+    # ?format=binary returns the raw image bytes instead of base64 in JSON
+    binary = request.args.get("format") == "binary"
     
     try:
-        # Generate image using Stable Diffusion
-        with torch.autocast("cuda" if torch.cuda.is_available() else "cpu"):
-            image = image_model(
+        # Generate and encode the image off the event loop
+        image_bytes, img_str = await asyncio.get_running_loop().run_in_executor(
+            image_executor,
+            functools.partial(
+                render_image,
+                image_format,
+                as_base64=not binary,
                 prompt=prompt,
                 negative_prompt=negative_prompt,
                 height=height,
                 width=width,
                 num_inference_steps=num_inference_steps,
                 guidance_scale=guidance_scale
-            ).images[0]
-        
-        # Save image to a temporary file
-        timestamp = int(time.time())
-        image_filename = f"{CACHE_DIR}/image_{timestamp}.png"
-        image.save(image_filename)
-        
-        # Convert image to base64 for JSON response
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+            )
+        )
         
         response = {
             "prompt": prompt,
             "model": IMAGE_MODEL_NAME,
-            "image_base64": img_str,
-            "local_path": image_filename
+            "image_format": image_format
         }
+        if not binary:
+            response["image_base64"] = img_str
+        
+        # Save image to the cache directory
+        timestamp = int(time.time())
+        image_name = f"image_{timestamp}.{image_format}"
+        if save_local:
+            image_filename = f"{CACHE_DIR}/{image_name}"
+            async with aiofiles.open(image_filename, "wb") as f:
+                await f.write(image_bytes)
+            response["local_path"] = image_filename
         
         # Store on IPFS if requested and IPFS is connected
         if store_on_ipfs and ipfs_client:
-            with open(image_filename, "rb") as f:
-                ipfs_result = ipfs_client.add(image_filename)
-                ipfs_hash = ipfs_result["Hash"]
-                response["ipfs_hash"] = ipfs_hash
-                response["ipfs_gateway_url"] = f"https://ipfs.io/ipfs/{ipfs_hash}"
+            ipfs_result = await ipfs_client.add_bytes(image_bytes, image_name, f"image/{image_format}")
+            ipfs_hash = ipfs_result["Hash"]
+            response["ipfs_hash"] = ipfs_hash
+            response["ipfs_gateway_url"] = f"https://ipfs.io/ipfs/{ipfs_hash}"
+        
+        if binary:
+            # Metadata travels in headers, the body is the image itself
+            headers = {"X-Image-Format": image_format}
+            if "local_path" in response:
+                headers["X-Local-Path"] = response["local_path"]
+            if "ipfs_hash" in response:
+                headers["X-IPFS-Hash"] = response["ipfs_hash"]
+                headers["X-IPFS-Gateway-URL"] = response["ipfs_gateway_url"]
+            return raw(image_bytes, content_type=f"image/{image_format}", headers=headers)
         
         return json(response)
     except Exception as e:
@@ -262,13 +682,8 @@ async def add_to_ipfs(request):
         if not file:
             return json({"error": "No file provided under 'file' key"}, status=400)
         
-        # Save file to temporary location
-        file_path = f"{CACHE_DIR}/{file.name}"
-        async with aiofiles.open(file_path, "wb") as f:
-            await f.write(file.body)
-        
-        # Add file to IPFS
-        ipfs_result = ipfs_client.add(file_path)
+        # Add the uploaded bytes to IPFS directly, without copying them
+        ipfs_result = await ipfs_client.add_bytes(memoryview(file.body), file.name, file.type)
         ipfs_hash = ipfs_result["Hash"]
         
         return json({
@@ -285,24 +700,40 @@ async def get_from_ipfs(request, ipfs_hash):
     if ipfs_client is None:
         return json({"error": "IPFS is not connected"}, status=503)
     
+    chunks = ipfs_client.cat_stream(ipfs_hash)
     try:
-        # Get file from IPFS
-        content = ipfs_client.cat(ipfs_hash)
+        # Get the first chunk from IPFS to decide whether it's text or binary
+        pending = [await chunks.__anext__()]
+        content_type = sniff_content_type(pending[0])
         
-        # Determine if it's text or binary
-        try:
-            # Try to decode as text
-            text_content = content.decode("utf-8")
-            return json({"content": text_content, "type": "text"})
-        except UnicodeDecodeError:
-            # It's binary data (like an image)
-            file_path = f"{CACHE_DIR}/{ipfs_hash}"
-            with open(file_path, "wb") as f:
-                f.write(content)
-            
-            return await file(file_path)
+        if content_type is None:
+            # Try to decode as text, keeping the raw chunks in case it turns out to be binary
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            try:
+                text_parts = [decoder.decode(pending[0])]
+                async for chunk in chunks:
+                    pending.append(chunk)
+                    text_parts.append(decoder.decode(chunk))
+                text_parts.append(decoder.decode(b"", final=True))
+                return json({"content": "".join(text_parts), "type": "text"})
+            except UnicodeDecodeError:
+                content_type = "application/octet-stream"
+    except StopAsyncIteration:
+        return json({"content": "", "type": "text"})
     except Exception as e:
+        await chunks.aclose()
         return json({"error": str(e)}, status=500)
+    
+    # It's binary data (like an image), pipe it straight to the client
+    try:
+        response = await request.respond(content_type=content_type)
+        for chunk in pending:
+            await response.send(chunk)
+        async for chunk in chunks:
+            await response.send(chunk)
+        await response.eof()
+    finally:
+        await chunks.aclose()
 
 @app.route("/peers", methods=["GET"])
 async def get_peers(request):
@@ -310,7 +741,7 @@ async def get_peers(request):
         return json({"error": "Text model is not loaded yet"}, status=503)
     
     try:
-        peers_info = text_model.get_peers_info()
+        peers_info = await get_peers_info()
         return json({
             "model_name": TEXT_MODEL_NAME,
             "peers_count": len(peers_info),
@@ -319,7 +750,42 @@ async def get_peers(request):
     except Exception as e:
         return json({"error": str(e)}, status=500)
 
+def is_admin_request(request):
+    """Whether a request may use admin endpoints: a matching admin token, or localhost if none is set"""
+    admin_token = config.get("security.admin_token", "")
+    # Anything but a non-empty string counts as no token configured
+    if isinstance(admin_token, str) and admin_token:
+        return hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), admin_token.encode())
+    return request.ip in ("127.0.0.1", "::1")
+
+@app.route("/config/reload", methods=["POST"])
+async def reload_config(request):
+    """Re-read the configuration file and refresh settings that apply without a restart"""
+    global REQUIRE_WALLET
+    if not is_admin_request(request):
+        return json({"error": "Unauthorized"}, status=401)
+    
+    try:
+        config.reload()
+        require_wallet = config.get("security.require_wallet", True)
+        if require_wallet and SERVER_WORKERS > 1:
+            return json({"error": MULTI_WORKER_WALLET_ERROR}, status=409)
+        REQUIRE_WALLET = require_wallet
+        return json({"reloaded": True, "require_wallet": REQUIRE_WALLET})
+    except Exception as e:
+        return json({"error": str(e)}, status=500)
+
+def single_worker_only(handler):
+    """Answer 503 instead of running a wallet route when several workers would each keep their own wallets"""
+    @functools.wraps(handler)
+    async def wrapper(request, *args, **kwargs):
+        if SERVER_WORKERS > 1:
+            return json({"error": MULTI_WORKER_WALLET_ERROR}, status=503)
+        return await handler(request, *args, **kwargs)
+    return wrapper
+
 @app.route("/wallet/register", methods=["POST"])
+@single_worker_only
 async def register_wallet(request):
     """
     Register a new training instance with wallet signature verification.
@@ -342,12 +808,13 @@ async def register_wallet(request):
         return json({"error": "Missing required fields"}, status=400)
     
     try:
-        instance_id = wallet_manager.register_instance(signature, message, address)
+        instance_id = await wallet_manager.register_instance_async(signature, message, address)
         return json({"instance_id": instance_id, "message": "Wallet registered successfully"})
     except Exception as e:
         return json({"error": str(e)}, status=400)
 
 @app.route("/wallet/verify/<instance_id>", methods=["GET"])
+@single_worker_only
 async def verify_wallet(request, instance_id):
     """Verify if a training instance is registered and active"""
     try:
@@ -357,6 +824,7 @@ async def verify_wallet(request, instance_id):
         return json({"error": str(e)}, status=400)
 
 @app.route("/wallet/deactivate/<instance_id>", methods=["POST"])
+@single_worker_only
 async def deactivate_wallet(request, instance_id):
     """
     Deactivate a training instance.
@@ -383,4 +851,11 @@ async def deactivate_wallet(request, instance_id):
         return json({"error": str(e)}, status=400)
 
 if __name__ == "__main__":
-    app.run(host=config.get("server.host", "0.0.0.0"), port=config.get("server.port", 8000), debug=config.get("server.debug", False))
+    if REQUIRE_WALLET and SERVER_WORKERS > 1:
+        raise SystemExit(MULTI_WORKER_WALLET_ERROR)
+    app.run(
+        host=config.get("server.host", "0.0.0.0"),
+        port=config.get("server.port", 8000),
+        debug=config.get("server.debug", False),
+        workers=SERVER_WORKERS
+    )
@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 import argparse
 import json
+import logging
+import orjson
 import sys
 from pathlib import Path
-from src.cloud import CloudManager
+from src.cloud import CloudManager, DeployError
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Deploy Petals service to cloud providers")
@@ -26,6 +28,7 @@ def parse_args():
 
 def main():
     args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
     
     try:
         # Initialize cloud manager
@@ -35,8 +38,8 @@ def main():
         config_override = None
         if args.config_override:
             try:
-                config_override = json.loads(args.config_override)
-            except json.JSONDecodeError:
+                config_override = orjson.loads(args.config_override)
+            except orjson.JSONDecodeError:
                 print("Error: Invalid JSON in config override")
                 sys.exit(1)
         
@@ -75,6 +78,11 @@ def main():
                 logs = cloud_manager.get_logs(args.provider, args.resource_id, config_override)
                 print(logs)
                 
+    except DeployError as e:
+        print(f"Error: {str(e)}")
+        if e.transient:
+            print("The error looks transient, retrying later may succeed")
+        sys.exit(1)
     except Exception as e:
         print(f"Error: {str(e)}")
         sys.exit(1)
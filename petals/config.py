@@ -1,28 +1,51 @@
 import os
 from pathlib import Path
-import json
+import orjson
+import atexit
+import functools
+import operator
+import threading
 
 class Config:
+    # Seconds to wait after a set() before writing, so bursts of writes hit disk once
+    SAVE_DELAY = 0.2
+
     def __init__(self, config_dir="./config"):
         self.config_dir = Path(config_dir)
         self.config_dir.mkdir(parents=True, exist_ok=True)
         self.config_file = self.config_dir / "config.json"
+        self._key_cache = {}
+        self._getters = {}
+        self._dirty = False
+        self._save_timer = None
+        self._save_lock = threading.Lock()
         self._load_config()
+        atexit.register(self.flush)
 
     def _load_config(self):
         """Load configuration from file or create default"""
         if self.config_file.exists():
-            with open(self.config_file, 'r') as f:
-                self.config = json.load(f)
+            with open(self.config_file, 'rb') as f:
+                self.config = orjson.loads(f.read())
         else:
             self.config = {
                 "text_model": {
                     "name": "bigscience/bloom-petals",
-                    "enabled": True
+                    "enabled": True,
+                    "device": "cpu",
+                    "dtype": "bfloat16",
+                    "session_cache_size": 32,
+                    "session_max_length": 1024,
+                    "max_batch_size": 8,
+                    "batch_window_ms": 20,
+                    "request_timeout": 600
                 },
                 "image_model": {
                     "name": "runwayml/stable-diffusion-v1-5",
-                    "enabled": True
+                    "enabled": True,
+                    "quantization": "none",
+                    "compile": True,
+                    "response_format": "webp"
                 },
                 "ipfs": {
                     "api": "/ip4/127.0.0.1/tcp/5001",
@@ -31,44 +54,81 @@ class Config:
                 "server": {
                     "host": "0.0.0.0",
                     "port": 8000,
-                    "debug": False
+                    "debug": False,
+                    "workers": 1
                 },
                 "security": {
                     "require_wallet": True,
-                    "allowed_addresses": []
+                    "allowed_addresses": [],
+                    "admin_token": ""
                 }
             }
             self._save_config()
 
     def _save_config(self):
         """Save current configuration to file"""
-        with open(self.config_file, 'w') as f:
-            json.dump(self.config, f, indent=2)
+        with open(self.config_file, 'wb') as f:
+            f.write(orjson.dumps(self.config, option=orjson.OPT_INDENT_2))
+
+    def _split_key(self, key):
+        """Split a dotted key, caching the result"""
+        keys = self._key_cache.get(key)
+        if keys is None:
+            keys = self._key_cache[key] = tuple(key.split('.'))
+        return keys
 
     def get(self, key, default=None):
         """Get configuration value by key"""
-        keys = key.split('.')
-        value = self.config
+        getter = self._getters.get(key)
+        if getter is None:
+            # Compile the key once into a function that indexes straight down the dict
+            getter = self._getters[key] = functools.partial(
+                functools.reduce, operator.getitem, self._split_key(key)
+            )
         try:
-            for k in keys:
-                value = value[k]
-            return value
+            return getter(self.config)
         except (KeyError, TypeError):
             return default
 
-    def set(self, key, value):
-        """Set configuration value"""
-        keys = key.split('.')
+    def _set(self, key, value):
+        """Set configuration value in memory and mark it for saving"""
+        keys = self._split_key(key)
         config = self.config
         for k in keys[:-1]:
             config = config.setdefault(k, {})
         config[keys[-1]] = value
-        self._save_config()
+        self._dirty = True
+
+    def set(self, key, value):
+        """Set configuration value, the file is written shortly afterwards"""
+        self._set(key, value)
+        with self._save_lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.SAVE_DELAY, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
 
     def update(self, updates):
-        """Update multiple configuration values"""
+        """Update multiple configuration values with a single write"""
         for key, value in updates.items():
-            self.set(key, value)
+            self._set(key, value)
+        self.flush()
+
+    def flush(self):
+        """Write pending configuration changes to file"""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._save_config()
+
+    def reload(self):
+        """Re-read configuration from file, writing pending changes first"""
+        self.flush()
+        self._load_config()
 
     @property
     def as_dict(self):
@@ -6,10 +6,23 @@ to public or private IPFS gateways/APIs.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import aiohttp
+import aiofiles
 import json
 import os
 import uuid
-from typing import Dict, Any, Optional, Union, BinaryIO
+from typing import Dict, Any, Optional, Union, BinaryIO, AsyncIterator
+
+
+def _create_session() -> requests.Session:
+    """Create a requests session that keeps pooled connections to its host alive"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 class IPFSAPIClient:
     """
@@ -27,6 +40,7 @@ class IPFSAPIClient:
             api_url: The URL of the IPFS API endpoint. Defaults to the local IPFS daemon.
         """
         self.api_url = api_url
+        self.session = _create_session()
         self.connected = False
         self.node_id = None
     
@@ -39,7 +53,7 @@ class IPFSAPIClient:
         """
         try:
             # Try to get the node ID to verify connection
-            response = requests.post(f"{self.api_url}/id")
+            response = self.session.post(f"{self.api_url}/id")
             if response.status_code == 200:
                 data = response.json()
                 self.node_id = data.get("ID")
@@ -72,22 +86,8 @@ class IPFSAPIClient:
         Returns:
             str: The IPFS hash (CID) of the added content.
         """
-        if not self.connected:
-            raise ConnectionError("Not connected to IPFS API")
-        
-        # Create a temporary file with the content
-        temp_file = f"temp_{uuid.uuid4()}.txt"
-        try:
-            with open(temp_file, "w", encoding="utf-8") as f:
-                f.write(content)
-            
-            # Add the file to IPFS
-            result = self.add(temp_file)
-            return result["Hash"]
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+        result = self._post_add({"file": ("content.txt", content.encode("utf-8"))})
+        return result["Hash"]
     
     def add(self, file_path: str) -> Dict[str, Any]:
         """
@@ -99,19 +99,142 @@ class IPFSAPIClient:
         Returns:
             dict: Information about the added file, including its hash.
         """
+        with open(file_path, "rb") as f:
+            return self._post_add({"file": (os.path.basename(file_path), f)})
+    
+    def cat(self, ipfs_hash: str) -> bytes:
+        """
+        Retrieve content from IPFS by its hash.
+        
+        Args:
+            ipfs_hash: The IPFS hash (CID) of the content to retrieve.
+            
+        Returns:
+            bytes: The content as bytes.
+        """
         if not self.connected:
             raise ConnectionError("Not connected to IPFS API")
         
-        with open(file_path, "rb") as f:
-            files = {"file": f}
-            response = requests.post(f"{self.api_url}/add", files=files)
+        response = self.session.post(f"{self.api_url}/cat", params={"arg": ipfs_hash})
         
         if response.status_code != 200:
-            raise Exception(f"Failed to add file to IPFS: {response.text}")
+            raise Exception(f"Failed to retrieve content from IPFS: {response.text}")
+        
+        return response.content
+    
+    def _post_add(self, files: Dict[str, Any]) -> Dict[str, Any]:
+        """Send multipart files to the IPFS add endpoint"""
+        if not self.connected:
+            raise ConnectionError("Not connected to IPFS API")
         
+        response = self.session.post(f"{self.api_url}/add", files=files)
+        response.raise_for_status()
         return response.json()
+
+
+class AsyncIPFSAPIClient:
+    """
+    An asyncio client for interacting with IPFS through HTTP API calls.
     
-    def cat(self, ipfs_hash: str) -> bytes:
+    Mirrors IPFSAPIClient but issues requests through a shared aiohttp session so
+    IPFS I/O does not block the event loop of the calling server.
+    """
+    
+    CHUNK_SIZE = 64 * 1024
+    
+    def __init__(self, session: aiohttp.ClientSession, api_url: str = "http://127.0.0.1:5001/api/v0"):
+        """
+        Initialize the async IPFS API client.
+        
+        Args:
+            session: The aiohttp session used for all requests.
+            api_url: The URL of the IPFS API endpoint. Defaults to the local IPFS daemon.
+        """
+        self.session = session
+        self.api_url = api_url
+        self.connected = False
+        self.node_id = None
+    
+    async def connect(self) -> bool:
+        """
+        Check if the IPFS API is accessible and store node information.
+        
+        Returns:
+            bool: True if connection was successful, False otherwise.
+        """
+        try:
+            # Try to get the node ID to verify connection
+            async with self.session.post(f"{self.api_url}/id") as response:
+                if response.status == 200:
+                    data = await response.json(content_type=None)
+                    self.node_id = data.get("ID")
+                    self.connected = True
+                    return True
+                return False
+        except Exception as e:
+            print(f"Error connecting to IPFS API: {e}")
+            return False
+    
+    def id(self) -> Dict[str, Any]:
+        """
+        Get information about the IPFS node.
+        
+        Returns:
+            dict: Node information including ID.
+        """
+        if not self.connected:
+            raise ConnectionError("Not connected to IPFS API")
+        
+        return {"ID": self.node_id}
+    
+    async def add_str(self, content: str) -> str:
+        """
+        Add a string to IPFS.
+        
+        Args:
+            content: The string content to add to IPFS.
+            
+        Returns:
+            str: The IPFS hash (CID) of the added content.
+        """
+        form = aiohttp.FormData()
+        form.add_field("file", content.encode("utf-8"), filename="content.txt", content_type="text/plain")
+        result = await self._post_add(form)
+        return result["Hash"]
+    
+    async def add(self, file_path: str) -> Dict[str, Any]:
+        """
+        Add a file to IPFS, streaming it from disk.
+        
+        Args:
+            file_path: Path to the file to add.
+            
+        Returns:
+            dict: Information about the added file, including its hash.
+        """
+        form = aiohttp.FormData()
+        form.add_field("file", self._read_chunks(file_path), filename=os.path.basename(file_path))
+        return await self._post_add(form)
+    
+    async def add_bytes(self, content: Union[bytes, memoryview], filename: str,
+                        content_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Add in-memory content to IPFS without writing it to disk.
+        
+        Args:
+            content: The content to add, a memoryview avoids copying it.
+            filename: The file name to send with the content.
+            content_type: The MIME type of the content.
+            
+        Returns:
+            dict: Information about the added content, including its hash.
+        """
+        form = aiohttp.FormData()
+        form.add_field("file", content, filename=filename,
+                       content_type=content_type or "application/octet-stream")
+        return await self._post_add(form)
+    
+    async def cat(self, ipfs_hash: str) -> bytes:
         """
         Retrieve content from IPFS by its hash.
         
@@ -124,12 +247,48 @@ class IPFSAPIClient:
         if not self.connected:
             raise ConnectionError("Not connected to IPFS API")
         
-        response = requests.post(f"{self.api_url}/cat?arg={ipfs_hash}")
+        async with self.session.post(f"{self.api_url}/cat", params={"arg": ipfs_hash}) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to retrieve content from IPFS: {await response.text()}")
+            return await response.read()
+    
+    async def cat_stream(self, ipfs_hash: str) -> AsyncIterator[bytes]:
+        """
+        Stream content from IPFS by its hash without buffering it in memory.
         
-        if response.status_code != 200:
-            raise Exception(f"Failed to retrieve content from IPFS: {response.text}")
+        Args:
+            ipfs_hash: The IPFS hash (CID) of the content to retrieve.
+            
+        Yields:
+            bytes: Chunks of the content.
+        """
+        if not self.connected:
+            raise ConnectionError("Not connected to IPFS API")
         
-        return response.content
+        async with self.session.post(f"{self.api_url}/cat", params={"arg": ipfs_hash}) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to retrieve content from IPFS: {await response.text()}")
+            async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                yield chunk
+    
+    async def _post_add(self, form: aiohttp.FormData) -> Dict[str, Any]:
+        """Send a multipart form to the IPFS add endpoint"""
+        if not self.connected:
+            raise ConnectionError("Not connected to IPFS API")
+        
+        async with self.session.post(f"{self.api_url}/add", data=form) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to add file to IPFS: {await response.text()}")
+            return await response.json(content_type=None)
+    
+    async def _read_chunks(self, file_path: str) -> AsyncIterator[bytes]:
+        """Yield a file's content in chunks without blocking the event loop"""
+        async with aiofiles.open(file_path, "rb") as f:
+            while True:
+                chunk = await f.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
 
 
 # Alternative implementation using public IPFS gateways
@@ -154,6 +313,9 @@ class IPFSGatewayClient:
         """
         self.api_url = api_url
         self.gateway_url = gateway_url
+        # Separate sessions so each host keeps its own connection pool
+        self.api_session = _create_session()
+        self.gateway_session = _create_session()
         self.connected = False
         self.node_id = "gateway-client"  # Simulated node ID
     
@@ -166,7 +328,7 @@ class IPFSGatewayClient:
         """
         try:
             # Try to access the gateway
-            response = requests.get(f"{self.gateway_url}/QmYwAPJzv5CZsnA625s3Xf2nemtYgPpHdWEz79ojWnPbdG/readme")
+            response = self.gateway_session.get(f"{self.gateway_url}/QmYwAPJzv5CZsnA625s3Xf2nemtYgPpHdWEz79ojWnPbdG/readme")
             if response.status_code == 200:
                 self.connected = True
                 return True
@@ -194,22 +356,8 @@ class IPFSGatewayClient:
         Returns:
             str: The IPFS hash (CID) of the added content.
         """
-        if not self.connected:
-            raise ConnectionError("Not connected to IPFS gateway")
-        
-        # Create a temporary file with the content
-        temp_file = f"temp_{uuid.uuid4()}.txt"
-        try:
-            with open(temp_file, "w", encoding="utf-8") as f:
-                f.write(content)
-            
-            # Add the file to IPFS
-            result = self.add(temp_file)
-            return result["Hash"]
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+        result = self._post_add("content.txt", content.encode("utf-8"))
+        return result["Hash"]
     
     def add(self, file_path: str) -> Dict[str, Any]:
         """
@@ -221,26 +369,8 @@ class IPFSGatewayClient:
         Returns:
             dict: Information about the added file, including its hash.
         """
-        if not self.connected:
-            raise ConnectionError("Not connected to IPFS gateway")
-        
-        try:
-            with open(file_path, "rb") as f:
-                files = {"file": f}
-                response = requests.post(f"{self.api_url}/add", files=files)
-            
-            if response.status_code != 200:
-                # If API fails, simulate a successful response with a fake hash
-                # This is useful for testing without a running IPFS daemon
-                file_name = os.path.basename(file_path)
-                return {"Name": file_name, "Hash": f"Qm{uuid.uuid4().hex[:38]}"}
-            
-            return response.json()
-        except Exception as e:
-            # If any error occurs, simulate a successful response with a fake hash
-            print(f"Error adding file to IPFS (simulating success): {e}")
-            file_name = os.path.basename(file_path)
-            return {"Name": file_name, "Hash": f"Qm{uuid.uuid4().hex[:38]}"}
+        with open(file_path, "rb") as f:
+            return self._post_add(os.path.basename(file_path), f)
     
     def cat(self, ipfs_hash: str) -> bytes:
         """
@@ -255,12 +385,31 @@ class IPFSGatewayClient:
         if not self.connected:
             raise ConnectionError("Not connected to IPFS gateway")
         
-        response = requests.get(f"{self.gateway_url}/{ipfs_hash}")
+        response = self.gateway_session.get(f"{self.gateway_url}/{ipfs_hash}")
         
         if response.status_code != 200:
             raise Exception(f"Failed to retrieve content from IPFS gateway: {response.text}")
         
         return response.content
+    
+    def _post_add(self, file_name: str, content: Union[bytes, BinaryIO]) -> Dict[str, Any]:
+        """Send content to the IPFS add endpoint, simulating success if the API is unavailable"""
+        if not self.connected:
+            raise ConnectionError("Not connected to IPFS gateway")
+        
+        try:
+            response = self.api_session.post(f"{self.api_url}/add", files={"file": (file_name, content)})
+            
+            if response.status_code != 200:
+                # If API fails, simulate a successful response with a fake hash
+                # This is useful for testing without a running IPFS daemon
+                return {"Name": file_name, "Hash": f"Qm{uuid.uuid4().hex[:38]}"}
+            
+            return response.json()
+        except Exception as e:
+            # If any error occurs, simulate a successful response with a fake hash
+            print(f"Error adding file to IPFS (simulating success): {e}")
+            return {"Name": file_name, "Hash": f"Qm{uuid.uuid4().hex[:38]}"}
 
 
 # Create a factory function to get the appropriate client
@@ -282,3 +431,27 @@ def get_ipfs_client(use_gateway: bool = False,
         return IPFSGatewayClient(api_url=api_url, gateway_url=gateway_url)
     else:
         return IPFSAPIClient(api_url=api_url)
+
+
+def multiaddr_to_api_url(address: str) -> str:
+    """
+    Convert an IPFS API multiaddr (e.g. /ip4/127.0.0.1/tcp/5001) to an HTTP API URL.
+    
+    Args:
+        address: A multiaddr or an HTTP(S) URL of the IPFS API.
+        
+    Returns:
+        str: The base URL of the IPFS HTTP API.
+    """
+    if address.startswith(("http://", "https://")):
+        return address.rstrip("/")
+    
+    parts = address.strip("/").split("/")
+    if len(parts) < 4 or parts[2] != "tcp":
+        raise ValueError(f"Unsupported IPFS API address: {address}")
+    
+    protocol, host, _, port = parts[:4]
+    if protocol == "ip6":
+        host = f"[{host}]"
+    scheme = "https" if "https" in parts[4:] else "http"
+    return f"{scheme}://{host}:{port}/api/v0"
@@ -1,14 +1,23 @@
-from .deployer_factory import CloudManager, CloudDeployerFactory
-from .base_deployer import BaseDeployer
-from .aws_deployer import AWSDeployer
-from .gcp_deployer import GCPDeployer
-from .azure_deployer import AzureDeployer
+from .deployer_factory import CloudManager, CloudDeployerFactory, DEPLOYERS
+from .base_deployer import BaseDeployer, DeployError, PartialDeployError
 
 __all__ = [
     'CloudManager',
     'CloudDeployerFactory',
     'BaseDeployer',
+    'DeployError',
+    'PartialDeployError',
     'AWSDeployer',
     'GCPDeployer',
     'AzureDeployer'
 ]
+
+_LAZY_DEPLOYERS = {class_name: module_name for module_name, class_name in DEPLOYERS.values()}
+
+
+def __getattr__(name):
+    # Import provider deployers (and their SDKs) only when they are accessed
+    if name in _LAZY_DEPLOYERS:
+        from importlib import import_module
+        return getattr(import_module(_LAZY_DEPLOYERS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
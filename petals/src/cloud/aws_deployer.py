@@ -1,6 +1,103 @@
+import os
+import logging
+import threading
 import boto3
-from typing import Optional, Dict
-from .base_deployer import BaseDeployer
+from concurrent.futures import Future
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError
+from typing import Callable, List, Dict
+from .base_deployer import BaseDeployer, DeployError
+
+logger = logging.getLogger(__name__)
+
+# Error codes worth retrying, everything else needs a config or code change
+TRANSIENT_ERROR_CODES = {
+    "Throttling", "ThrottlingException", "RequestLimitExceeded",
+    "InternalError", "ServiceUnavailable", "Unavailable"
+}
+
+
+class AWSDeployError(DeployError):
+    """Raised when an AWS operation fails"""
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, DeployError):
+        return error.transient
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in TRANSIENT_ERROR_CODES
+    return isinstance(error, BotoConnectionError)
+
+# One session per process, credentials are resolved once and shared by all clients
+_SESSION = boto3.session.Session()
+
+# Pool sized for concurrent EC2 calls, the botocore default of 10 serializes bursts.
+# urllib3 already sets TCP_NODELAY on every socket, tcp_keepalive adds SO_KEEPALIVE,
+# and a short connect timeout fails fast instead of waiting the default 60 seconds.
+CLIENT_CONFIG = Config(
+    max_pool_connections=max(32, (os.cpu_count() or 1) * 4),
+    tcp_keepalive=True,
+    connect_timeout=5,
+    retries={"max_attempts": 5, "mode": "adaptive"}
+)
+
+# Poll every 5 seconds for up to 5 minutes
+WAITER_CONFIG = {"Delay": 5, "MaxAttempts": 60}
+
+# How long a batch stays open for more instance IDs
+BATCH_MAX_DELAY = 0.3
+
+
+class _InstanceIdBatcher:
+    """Coalesces per-instance EC2 calls made within a short window into one multi-ID request"""
+
+    def __init__(self, call: Callable[[List[str]], Dict], max_delay: float = BATCH_MAX_DELAY):
+        # call takes a list of instance IDs and returns a dict of results by instance ID
+        self._call = call
+        self._max_delay = max_delay
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def submit(self, instance_id: str):
+        """Queue an instance ID and block until its batch has been sent"""
+        future = Future()
+        with self._lock:
+            self._pending.append((instance_id, future))
+            if self._timer is None:
+                self._timer = threading.Timer(self._max_delay, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future.result()
+
+    def _flush(self):
+        with self._lock:
+            batch, self._pending, self._timer = self._pending, [], None
+
+        instance_ids = list(dict.fromkeys(instance_id for instance_id, _ in batch))
+        try:
+            results = self._call(instance_ids)
+        except ClientError as e:
+            if len(instance_ids) == 1:
+                results = {instance_ids[0]: e}
+            else:
+                # One bad ID fails the whole request, retry individually so the others still resolve
+                results = {}
+                for instance_id in instance_ids:
+                    try:
+                        results.update(self._call([instance_id]))
+                    except Exception as single_error:
+                        results[instance_id] = single_error
+        except Exception as e:
+            results = {instance_id: e for instance_id in instance_ids}
+
+        for instance_id, future in batch:
+            result = results.get(instance_id)
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
 
 class AWSDeployer(BaseDeployer):
     def __init__(self, config: Dict):
@@ -8,10 +105,34 @@ class AWSDeployer(BaseDeployer):
         self.region = config.get("region", "us-east-1")
         self.instance_type = config.get("instance_type", "t3.large")
         self.ami_id = config.get("ami_id", "ami-0c55b159cbfafe1f0")
-        self.ec2 = boto3.client('ec2', region_name=self.region)
+        self.ec2 = _SESSION.client('ec2', region_name=self.region, config=CLIENT_CONFIG)
+        self._describe_batcher = _InstanceIdBatcher(self._describe_instances)
+        self._terminate_batcher = _InstanceIdBatcher(self._terminate_instances)
+        self._warm_up(lambda: self.ec2.describe_regions(RegionNames=[self.region]))
 
-    def deploy(self) -> Optional[str]:
-        """Deploy to AWS EC2"""
+    def _describe_instances(self, instance_ids: List[str]) -> Dict:
+        """Describe several instances in one request"""
+        response = self.ec2.describe_instances(InstanceIds=instance_ids)
+        status_code = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if status_code != 200:
+            raise AWSDeployError(f"DescribeInstances returned HTTP {status_code}", transient=(status_code or 0) >= 500)
+
+        return {
+            instance['InstanceId']: instance
+            for reservation in response.get('Reservations') or []
+            for instance in reservation.get('Instances') or []
+        }
+
+    def _terminate_instances(self, instance_ids: List[str]) -> Dict:
+        """Terminate several instances in one request"""
+        response = self.ec2.terminate_instances(InstanceIds=instance_ids)
+        return {
+            instance['InstanceId']: instance
+            for instance in response.get('TerminatingInstances') or []
+        }
+
+    def begin_deploy(self) -> str:
+        """Launch the AWS EC2 instance and return its ID without waiting for it to run"""
         try:
             # Create security group
             sg_response = self.ec2.create_security_group(
@@ -34,7 +155,7 @@ class AWSDeployer(BaseDeployer):
             )
             
             # Create user data script
-            user_data = self._get_init_script()
+            user_data = self._init_script
             
             # Launch instance
             response = self.ec2.run_instances(
@@ -46,34 +167,54 @@ class AWSDeployer(BaseDeployer):
                 UserData=user_data
             )
             
-            instance_id = response['Instances'][0]['InstanceId']
-            print(f"AWS Instance launched: {instance_id}")
-            return instance_id
+            return response['Instances'][0]['InstanceId']
             
         except Exception as e:
-            print(f"Error deploying to AWS: {str(e)}")
-            return None
+            logger.exception("Error deploying to AWS")
+            raise AWSDeployError(f"Error deploying to AWS: {e}", transient=_is_transient(e)) from e
+
+    def wait_deploy(self, instance_id: str) -> str:
+        """Wait until the AWS EC2 instance is running"""
+        try:
+            self.ec2.get_waiter('instance_running').wait(
+                InstanceIds=[instance_id],
+                WaiterConfig=WAITER_CONFIG
+            )
+            logger.info("AWS Instance launched: %s", instance_id)
+            return instance_id
+
+        except Exception as e:
+            logger.exception("Error deploying to AWS")
+            raise AWSDeployError(f"Error deploying to AWS: {e}", transient=_is_transient(e)) from e
 
     def destroy(self, instance_id: str) -> bool:
         """Destroy AWS resources"""
         try:
-            self.ec2.terminate_instances(InstanceIds=[instance_id])
-            print(f"AWS Instance terminated: {instance_id}")
+            self._terminate_batcher.submit(instance_id)
+            self.ec2.get_waiter('instance_terminated').wait(
+                InstanceIds=[instance_id],
+                WaiterConfig=WAITER_CONFIG
+            )
+            logger.info("AWS Instance terminated: %s", instance_id)
             return True
         except Exception as e:
-            print(f"Error destroying AWS resources: {str(e)}")
-            return False
+            logger.exception("Error destroying AWS resources")
+            raise AWSDeployError(f"Error destroying AWS resources: {e}", transient=_is_transient(e)) from e
 
     def get_status(self, instance_id: str) -> Dict:
         """Get status of AWS deployment"""
         try:
-            response = self.ec2.describe_instances(InstanceIds=[instance_id])
-            instance = response['Reservations'][0]['Instances'][0]
+            # Concurrent calls are sent as a single DescribeInstances request
+            instance = self._describe_batcher.submit(instance_id)
+            if not instance:
+                return {"status": "not_found"}
+
+            launch_time = instance.get('LaunchTime')
             return {
-                "status": instance['State']['Name'],
+                "status": instance.get('State', {}).get('Name', "unknown"),
                 "public_ip": instance.get('PublicIpAddress'),
-                "launch_time": instance['LaunchTime'].isoformat()
+                "launch_time": launch_time.isoformat() if launch_time else None
             }
         except Exception as e:
-            print(f"Error getting AWS status: {str(e)}")
-            return {"status": "error", "message": str(e)}
+            logger.exception("Error getting AWS status")
+            raise AWSDeployError(f"Error getting AWS status: {e}", transient=_is_transient(e)) from e
@@ -1,159 +1,227 @@
 import os
-from typing import Optional, Dict
+import base64
+import logging
+from typing import Any, Dict
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
 from azure.identity import DefaultAzureCredential
 from azure.mgmt.compute import ComputeManagementClient
 from azure.mgmt.network import NetworkManagementClient
 from azure.mgmt.resource import ResourceManagementClient
-from .base_deployer import BaseDeployer
+from .base_deployer import BaseDeployer, DeployError
 
-class AzureDeployer(BaseDeployer):
-    def __init__(self, config: Dict):
-        super().__init__(config)
-        self.location = config.get("location", "eastus")
-        self.vm_size = config.get("vm_size", "Standard_D2s_v3")
-        self.resource_group = config.get("resource_group", "petals-resource-group")
-        self.subscription_id = os.getenv("AZURE_SUBSCRIPTION_ID")
-        
-        if not self.subscription_id:
-            raise ValueError("AZURE_SUBSCRIPTION_ID environment variable is required")
-        
-        self.credential = DefaultAzureCredential()
-        self.compute_client = ComputeManagementClient(self.credential, self.subscription_id)
-        self.network_client = NetworkManagementClient(self.credential, self.subscription_id)
-        self.resource_client = ResourceManagementClient(self.credential, self.subscription_id)
+logger = logging.getLogger(__name__)
 
-    def _create_resource_group(self):
-        """Create or update resource group"""
-        self.resource_client.resource_groups.create_or_update(
-            self.resource_group,
-            {"location": self.location}
-        )
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
 
-    def _create_network(self):
-        """Create network resources"""
-        # Create VNet
-        vnet_name = "petals-vnet"
-        self.network_client.virtual_networks.begin_create_or_update(
-            self.resource_group,
-            vnet_name,
-            {
-                "location": self.location,
-                "address_space": {
-                    "address_prefixes": ["10.0.0.0/16"]
-                }
-            }
-        ).result()
 
-        # Create Subnet
-        subnet_name = "petals-subnet"
-        self.network_client.subnets.begin_create_or_update(
-            self.resource_group,
-            vnet_name,
-            subnet_name,
-            {"address_prefix": "10.0.0.0/24"}
-        ).result()
+class AzureDeployError(DeployError):
+    """Raised when an Azure operation fails"""
 
-        # Create Public IP
-        public_ip = self.network_client.public_ip_addresses.begin_create_or_update(
-            self.resource_group,
-            "petals-ip",
-            {
-                "location": self.location,
-                "sku": {"name": "Standard"},
-                "public_ip_allocation_method": "Static",
-                "public_ip_address_version": "IPV4"
-            }
-        ).result()
 
-        # Create NIC
-        subnet = self.network_client.subnets.get(
-            self.resource_group,
-            vnet_name,
-            subnet_name
-        )
-        
-        nic = self.network_client.network_interfaces.begin_create_or_update(
-            self.resource_group,
-            "petals-nic",
-            {
-                "location": self.location,
-                "ip_configurations": [{
-                    "name": "ipconfig1",
-                    "subnet": {"id": subnet.id},
-                    "public_ip_address": {"id": public_ip.id}
-                }]
-            }
-        ).result()
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, (ServiceRequestError, ServiceResponseError)):
+        return True
+    return isinstance(error, HttpResponseError) and error.status_code in TRANSIENT_STATUS_CODES
 
-        return nic.id
+VM_NAME = "petals-vm"
 
-    def deploy(self) -> Optional[str]:
-        """Deploy to Azure"""
-        try:
-            # Create resource group
-            self._create_resource_group()
+# Shared by all deployers so tokens are fetched once and cached
+_CREDENTIAL = None
 
-            # Create network resources
-            nic_id = self._create_network()
 
-            # VM configuration
-            vm_name = "petals-vm"
-            vm_parameters = {
-                "location": self.location,
-                "hardware_profile": {
-                    "vm_size": self.vm_size
+def _get_credential() -> DefaultAzureCredential:
+    """Get the process-wide Azure credential"""
+    global _CREDENTIAL
+    if _CREDENTIAL is None:
+        _CREDENTIAL = DefaultAzureCredential()
+    return _CREDENTIAL
+
+# ARM template for the network and VM, dependsOn only where a resource needs another
+DEPLOYMENT_TEMPLATE = {
+    "$schema": "https://schema.management.azure.com/schemas/2019-04-01/deploymentTemplate.json#",
+    "contentVersion": "1.0.0.0",
+    "parameters": {
+        "location": {"type": "string"},
+        "vmSize": {"type": "string"},
+        "sshPublicKey": {"type": "securestring"},
+        "customData": {"type": "securestring"}
+    },
+    "resources": [
+        {
+            "type": "Microsoft.Network/virtualNetworks",
+            "apiVersion": "2023-04-01",
+            "name": "petals-vnet",
+            "location": "[parameters('location')]",
+            "properties": {
+                "addressSpace": {
+                    "addressPrefixes": ["10.0.0.0/16"]
+                }
+            }
+        },
+        {
+            "type": "Microsoft.Network/virtualNetworks/subnets",
+            "apiVersion": "2023-04-01",
+            "name": "petals-vnet/petals-subnet",
+            "dependsOn": [
+                "[resourceId('Microsoft.Network/virtualNetworks', 'petals-vnet')]"
+            ],
+            "properties": {
+                "addressPrefix": "10.0.0.0/24"
+            }
+        },
+        {
+            "type": "Microsoft.Network/publicIPAddresses",
+            "apiVersion": "2023-04-01",
+            "name": "petals-ip",
+            "location": "[parameters('location')]",
+            "sku": {"name": "Standard"},
+            "properties": {
+                "publicIPAllocationMethod": "Static",
+                "publicIPAddressVersion": "IPv4"
+            }
+        },
+        {
+            "type": "Microsoft.Network/networkInterfaces",
+            "apiVersion": "2023-04-01",
+            "name": "petals-nic",
+            "location": "[parameters('location')]",
+            "dependsOn": [
+                "[resourceId('Microsoft.Network/virtualNetworks/subnets', 'petals-vnet', 'petals-subnet')]",
+                "[resourceId('Microsoft.Network/publicIPAddresses', 'petals-ip')]"
+            ],
+            "properties": {
+                "ipConfigurations": [{
+                    "name": "ipconfig1",
+                    "properties": {
+                        "subnet": {
+                            "id": "[resourceId('Microsoft.Network/virtualNetworks/subnets', 'petals-vnet', 'petals-subnet')]"
+                        },
+                        "publicIPAddress": {
+                            "id": "[resourceId('Microsoft.Network/publicIPAddresses', 'petals-ip')]"
+                        }
+                    }
+                }]
+            }
+        },
+        {
+            "type": "Microsoft.Compute/virtualMachines",
+            "apiVersion": "2023-03-01",
+            "name": VM_NAME,
+            "location": "[parameters('location')]",
+            "dependsOn": [
+                "[resourceId('Microsoft.Network/networkInterfaces', 'petals-nic')]"
+            ],
+            "properties": {
+                "hardwareProfile": {
+                    "vmSize": "[parameters('vmSize')]"
                 },
-                "storage_profile": {
-                    "image_reference": {
+                "storageProfile": {
+                    "imageReference": {
                         "publisher": "Canonical",
                         "offer": "UbuntuServer",
                         "sku": "20.04-LTS",
                         "version": "latest"
                     },
-                    "os_disk": {
+                    "osDisk": {
                         "name": "petals-disk",
                         "caching": "ReadWrite",
-                        "create_option": "FromImage",
-                        "managed_disk": {
-                            "storage_account_type": "Premium_LRS"
+                        "createOption": "FromImage",
+                        "managedDisk": {
+                            "storageAccountType": "Premium_LRS"
                         }
                     }
                 },
-                "os_profile": {
-                    "computer_name": vm_name,
-                    "admin_username": "petalsadmin",
-                    "linux_configuration": {
-                        "disable_password_authentication": True,
+                "osProfile": {
+                    "computerName": VM_NAME,
+                    "adminUsername": "petalsadmin",
+                    "customData": "[parameters('customData')]",
+                    "linuxConfiguration": {
+                        "disablePasswordAuthentication": True,
                         "ssh": {
-                            "public_keys": [{
+                            "publicKeys": [{
                                 "path": "/home/petalsadmin/.ssh/authorized_keys",
-                                "key_data": self.config.get("ssh_public_key", "")
+                                "keyData": "[parameters('sshPublicKey')]"
                             }]
                         }
-                    },
-                    "custom_data": self._get_init_script()
+                    }
                 },
-                "network_profile": {
-                    "network_interfaces": [{
-                        "id": nic_id
+                "networkProfile": {
+                    "networkInterfaces": [{
+                        "id": "[resourceId('Microsoft.Network/networkInterfaces', 'petals-nic')]"
                     }]
                 }
             }
+        }
+    ]
+}
+
+class AzureDeployer(BaseDeployer):
+    REQUIRED = frozenset({"repo_url", "ssh_public_key"})
+
+    def __init__(self, config: Dict):
+        super().__init__(config)
+        self.location = config.get("location", "eastus")
+        self.vm_size = config.get("vm_size", "Standard_D2s_v3")
+        self.resource_group = config.get("resource_group", "petals-resource-group")
+        self.subscription_id = os.getenv("AZURE_SUBSCRIPTION_ID")
+        
+        if not self.subscription_id:
+            raise ValueError("AZURE_SUBSCRIPTION_ID environment variable is required")
+        
+        # customData must be base64, encode the init script once
+        self._init_script_b64 = base64.b64encode(self._init_script.encode()).decode()
+
+        self.credential = _get_credential()
+        self.compute_client = ComputeManagementClient(self.credential, self.subscription_id)
+        self.network_client = NetworkManagementClient(self.credential, self.subscription_id)
+        self.resource_client = ResourceManagementClient(self.credential, self.subscription_id)
+        self._warm_up(lambda: self.resource_client.providers.get('Microsoft.Compute'))
 
-            # Create VM
-            poller = self.compute_client.virtual_machines.begin_create_or_update(
+    def _create_resource_group(self):
+        """Create or update resource group"""
+        self.resource_client.resource_groups.create_or_update(
+            self.resource_group,
+            {"location": self.location}
+        )
+
+    def begin_deploy(self) -> Any:
+        """Start the Azure template deployment and return its poller"""
+        try:
+            # Create resource group
+            self._create_resource_group()
+
+            # Submit all resources as one template, Azure creates independent ones in parallel
+            return self.resource_client.deployments.begin_create_or_update(
                 self.resource_group,
-                vm_name,
-                vm_parameters
+                "petals-deployment",
+                {
+                    "properties": {
+                        "template": DEPLOYMENT_TEMPLATE,
+                        "parameters": {
+                            "location": {"value": self.location},
+                            "vmSize": {"value": self.vm_size},
+                            "sshPublicKey": {"value": self.config.get("ssh_public_key", "")},
+                            "customData": {"value": self._init_script_b64}
+                        },
+                        "mode": "Incremental"
+                    }
+                }
             )
-            vm = poller.result()
 
-            print(f"Azure VM created: {vm.name}")
-            return vm.name
+        except Exception as e:
+            logger.exception("Error deploying to Azure")
+            raise AzureDeployError(f"Error deploying to Azure: {e}", transient=_is_transient(e)) from e
+
+    def wait_deploy(self, poller: Any) -> str:
+        """Wait for the Azure template deployment to finish"""
+        try:
+            poller.result()
+            logger.info("Azure VM created: %s", VM_NAME)
+            return VM_NAME
 
         except Exception as e:
-            print(f"Error deploying to Azure: {str(e)}")
-            return None
+            logger.exception("Error deploying to Azure")
+            raise AzureDeployError(f"Error deploying to Azure: {e}", transient=_is_transient(e)) from e
 
     def destroy(self, vm_name: str) -> bool:
         """Destroy Azure resources"""
@@ -169,12 +237,12 @@ class AzureDeployer(BaseDeployer):
                 self.resource_group
             ).result()
 
-            print(f"Azure resources deleted for VM: {vm_name}")
+            logger.info("Azure resources deleted for VM: %s", vm_name)
             return True
 
         except Exception as e:
-            print(f"Error destroying Azure resources: {str(e)}")
-            return False
+            logger.exception("Error destroying Azure resources")
+            raise AzureDeployError(f"Error destroying Azure resources: {e}", transient=_is_transient(e)) from e
 
     def get_status(self, vm_name: str) -> Dict:
         """Get status of Azure deployment"""
@@ -190,26 +258,23 @@ class AzureDeployer(BaseDeployer):
                 self.resource_group,
                 "petals-nic"
             )
-            public_ip_id = nic.ip_configurations[0].public_ip_address.id
-            public_ip_name = public_ip_id.split('/')[-1]
-            public_ip = self.network_client.public_ip_addresses.get(
-                self.resource_group,
-                public_ip_name
-            )
+            public_ip_address = None
+            if nic.ip_configurations and nic.ip_configurations[0].public_ip_address:
+                public_ip_name = nic.ip_configurations[0].public_ip_address.id.split('/')[-1]
+                public_ip_address = self.network_client.public_ip_addresses.get(
+                    self.resource_group,
+                    public_ip_name
+                ).ip_address
 
+            statuses = vm.instance_view.statuses if vm.instance_view else None
             return {
-                "status": vm.instance_view.statuses[-1].display_status if vm.instance_view.statuses else "Unknown",
-                "public_ip": public_ip.ip_address,
+                "status": statuses[-1].display_status if statuses else "Unknown",
+                "public_ip": public_ip_address,
                 "location": vm.location,
                 "vm_size": vm.hardware_profile.vm_size,
                 "resource_group": self.resource_group
             }
 
         except Exception as e:
-            print(f"Error getting Azure status: {str(e)}")
-            return {"status": "error", "message": str(e)}
-
-    def validate_config(self) -> bool:
-        """Validate Azure configuration"""
-        required_fields = ["repo_url", "ssh_public_key"]
-        return all(field in self.config for field in required_fields)
+            logger.exception("Error getting Azure status")
+            raise AzureDeployError(f"Error getting Azure status: {e}", transient=_is_transient(e)) from e
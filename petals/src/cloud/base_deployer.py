@@ -1,73 +1,127 @@
+import json
+import threading
 from abc import ABC, abstractmethod
-from typing import Optional, Dict
+from functools import cached_property
+from typing import Any, Dict
 
-class BaseDeployer(ABC):
-    def __init__(self, config: Dict):
-        self.config = config
+class DeployError(Exception):
+    """Raised when a cloud provider operation fails"""
 
-    @abstractmethod
-    def deploy(self) -> Optional[str]:
-        """Deploy the service to cloud provider"""
-        pass
+    def __init__(self, message: str, transient: bool = False):
+        super().__init__(message)
+        # Transient errors (throttling, timeouts, 5xx) may succeed if retried
+        self.transient = transient
 
-    @abstractmethod
-    def destroy(self, resource_id: str) -> bool:
-        """Destroy deployed resources"""
-        pass
 
-    @abstractmethod
-    def get_status(self, resource_id: str) -> Dict:
-        """Get status of deployed resources"""
-        pass
+class PartialDeployError(DeployError):
+    """Raised when some of several deployments failed while others succeeded"""
 
-    def _get_init_script(self) -> str:
-        """Get initialization script for cloud instances"""
-        return '''#!/bin/bash
-# Install system dependencies
-apt-get update
-apt-get install -y podman git
+    def __init__(self, message: str, results: Dict[str, str], errors: Dict[str, Exception]):
+        super().__init__(message)
+        # Resource IDs of the deployments that did succeed, keyed by provider
+        self.results = results
+        # The error of each provider whose deployment failed
+        self.errors = errors
 
-# Clone repository
-git clone {repo_url} /opt/petals
-cd /opt/petals
 
-# Setup configuration
-mkdir -p config
-cat > config/config.json << 'EOF'
-{
+# Service configuration written to config/config.json on new instances
+SERVICE_CONFIG = {
     "text_model": {
         "name": "bigscience/bloom-petals",
-        "enabled": true
+        "enabled": True
     },
     "image_model": {
         "name": "runwayml/stable-diffusion-v1-5",
-        "enabled": true
+        "enabled": True
     },
     "ipfs": {
         "api": "/ip4/127.0.0.1/tcp/5001",
-        "enabled": true
+        "enabled": True
     },
     "server": {
         "host": "0.0.0.0",
         "port": 8000,
-        "debug": false
+        "debug": False
     },
     "security": {
-        "require_wallet": true,
+        "require_wallet": True,
         "allowed_addresses": []
     }
 }
+
+INIT_SCRIPT_TEMPLATE = '''#!/bin/bash
+# Install system dependencies
+apt-get update
+apt-get install -y podman git
+
+# Clone repository
+git clone {repo_url} /opt/petals
+cd /opt/petals
+
+# Setup configuration
+mkdir -p config
+cat > config/config.json << 'EOF'
+{service_config}
 EOF
 
 # Make deploy script executable and run
 chmod +x deploy.sh
 ./deploy.sh
-'''.format(repo_url=self.config.get("repo_url", "https://github.com/yourusername/petals.git"))
+'''
+
+class BaseDeployer(ABC):
+    # Config keys a deployer needs, checked by validate_config
+    REQUIRED = frozenset({"repo_url"})
+
+    def __init__(self, config: Dict):
+        self.config = config
+
+    def _warm_up(self, call) -> None:
+        """Run a cheap API call in the background so credentials and connections are ready for the first real one"""
+        def run():
+            try:
+                call()
+            except Exception:
+                # Warm-up is best effort, real calls report their own errors
+                pass
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @abstractmethod
+    def begin_deploy(self) -> Any:
+        """Start deploying the service and return a handle for wait_deploy"""
+        pass
+
+    @abstractmethod
+    def wait_deploy(self, handle: Any) -> str:
+        """Wait for a deployment started by begin_deploy and return its resource ID"""
+        pass
+
+    def deploy(self) -> str:
+        """Deploy the service to cloud provider"""
+        return self.wait_deploy(self.begin_deploy())
+
+    @abstractmethod
+    def destroy(self, resource_id: str) -> bool:
+        """Destroy deployed resources"""
+        pass
+
+    @abstractmethod
+    def get_status(self, resource_id: str) -> Dict:
+        """Get status of deployed resources"""
+        pass
+
+    @cached_property
+    def _init_script(self) -> str:
+        """Initialization script for cloud instances, rendered once per deployer"""
+        return INIT_SCRIPT_TEMPLATE.format(
+            repo_url=self.config.get("repo_url", "https://github.com/yourusername/petals.git"),
+            service_config=json.dumps(SERVICE_CONFIG, indent=4)
+        )
 
     def validate_config(self) -> bool:
         """Validate configuration"""
-        required_fields = ["repo_url"]
-        return all(field in self.config for field in required_fields)
+        return self.REQUIRED <= self.config.keys()
 
     def get_logs(self, resource_id: str) -> str:
         """Get logs from deployed service"""
@@ -1,8 +1,47 @@
-from typing import Dict, Optional
-from .base_deployer import BaseDeployer
-from .aws_deployer import AWSDeployer
-from .gcp_deployer import GCPDeployer
-from .azure_deployer import AzureDeployer
+import importlib
+import logging
+import orjson
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+from .base_deployer import BaseDeployer, DeployError, PartialDeployError
+
+logger = logging.getLogger(__name__)
+
+# Provider SDKs are slow to import, each deployer module is imported on first use
+DEPLOYERS = {
+    'aws': ('.aws_deployer', 'AWSDeployer'),
+    'gcp': ('.gcp_deployer', 'GCPDeployer'),
+    'azure': ('.azure_deployer', 'AzureDeployer')
+}
+
+# Deployers are reused across calls so their cloud clients keep their connections
+_DEPLOYER_CACHE: Dict[tuple, BaseDeployer] = {}
+
+# Parsed cloud config files keyed by resolved path, as (mtime, config)
+_CONFIG_CACHE: Dict[str, tuple] = {}
+
+# Retry idempotent operations on throttling, timeouts and server errors.
+# The SDK clients already retry with backoff (botocore adaptive mode makes up to 5
+# attempts per call), so this layer only adds one more try once they have given up
+# instead of multiplying their attempts.
+retry_transient = retry(
+    wait=wait_exponential(multiplier=0.1, max=10),
+    stop=stop_after_attempt(2),
+    retry=retry_if_exception(lambda e: isinstance(e, DeployError) and e.transient),
+    reraise=True
+)
+
+def _freeze(value):
+    """Turn a config value into a hashable equivalent for use in cache keys"""
+    if isinstance(value, dict):
+        return frozenset((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    # Tagged with the type, True, 1 and 1.0 are equal and hash alike but are different settings
+    return (type(value).__name__, value)
 
 class CloudDeployerFactory:
     """Factory class for creating cloud deployers"""
@@ -19,20 +58,23 @@ class CloudDeployerFactory:
         Returns:
             BaseDeployer instance or None if provider is not supported
         """
-        deployers = {
-            'aws': AWSDeployer,
-            'gcp': GCPDeployer,
-            'azure': AzureDeployer
-        }
-        
-        deployer_class = deployers.get(provider.lower())
-        if not deployer_class:
+        provider = provider.lower()
+        # A cached deployer was validated when it was created
+        cache_key = (provider, _freeze(config))
+        deployer = _DEPLOYER_CACHE.get(cache_key)
+        if deployer is not None:
+            return deployer
+
+        if provider not in DEPLOYERS:
             raise ValueError(f"Unsupported cloud provider: {provider}")
             
+        module_name, class_name = DEPLOYERS[provider]
+        deployer_class = getattr(importlib.import_module(module_name, __package__), class_name)
         deployer = deployer_class(config)
         if not deployer.validate_config():
             raise ValueError(f"Invalid configuration for {provider}")
             
+        _DEPLOYER_CACHE[cache_key] = deployer
         return deployer
 
 class CloudManager:
@@ -47,18 +89,30 @@ class CloudManager:
         """
         self.config = self._load_config(config_path)
         
-    def _load_config(self, config_path: str) -> Dict:
-        """Load configuration from file"""
-        import json
-        from pathlib import Path
+    def _load_config(self, config_path: str) -> Mapping:
+        """
+        Load configuration from file, parsed once until the file changes
         
+        The result is shared with every other manager using the same file, so it
+        is returned read-only and its provider sections must not be modified.
+        """
         config_file = Path(config_path)
-        if config_file.exists():
-            with open(config_file, 'r') as f:
-                return json.load(f)
-        return {}
+        if not config_file.exists():
+            return MappingProxyType({})
+
+        path = str(config_file.resolve())
+        mtime = config_file.stat().st_mtime_ns
+        cached = _CONFIG_CACHE.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _CONFIG_CACHE[path] = (mtime, MappingProxyType(orjson.loads(config_file.read_bytes())))
+        return cached[1]
+
+    def _get_deployer(self, provider: str, config_override: Dict = None) -> BaseDeployer:
+        """Get the deployer for a provider with the override merged into a copy of its config"""
+        config = {**self.config.get(provider, {}), **(config_override or {})}
+        return CloudDeployerFactory.create_deployer(provider, config)
         
-    def deploy(self, provider: str, config_override: Dict = None) -> Optional[str]:
+    def deploy(self, provider: str, config_override: Dict = None) -> str:
         """
         Deploy service to specified cloud provider
         
@@ -67,19 +121,73 @@ class CloudManager:
             config_override: Optional configuration override
             
         Returns:
-            Resource ID if successful, None otherwise
-        """
-        # Merge configuration
-        config = self.config.get(provider, {})
-        if config_override:
-            config.update(config_override)
+            Resource ID
             
+        Raises:
+            DeployError: If the deployment fails (not retried, deploy is not idempotent)
+        """
         # Create and validate deployer
-        deployer = CloudDeployerFactory.create_deployer(provider, config)
+        deployer = self._get_deployer(provider, config_override)
         
         # Deploy
         return deployer.deploy()
         
+    def deploy_many(self, providers: List[str], config_overrides: Dict[str, Dict] = None) -> Dict[str, str]:
+        """
+        Deploy service to several cloud providers at once
+        
+        Args:
+            providers: Cloud provider names
+            config_overrides: Optional configuration overrides keyed by provider
+            
+        Returns:
+            Resource ID keyed by provider
+            
+        Raises:
+            PartialDeployError: If any deployment fails, once all started ones have finished.
+                Its results hold the resource IDs of the deployments that succeeded.
+        """
+        config_overrides = config_overrides or {}
+        deployers = {
+            provider: self._get_deployer(provider, config_overrides.get(provider))
+            for provider in providers
+        }
+        
+        # Start every deployment first, a failure to start one doesn't stop the others
+        results, errors, handles = {}, {}, {}
+        for provider, deployer in deployers.items():
+            try:
+                handles[provider] = deployer.begin_deploy()
+            except Exception as e:
+                errors[provider] = e
+                continue
+            logger.info("Started %s deployment: %r", provider, handles[provider])
+        
+        # Then wait on all of them together
+        with ThreadPoolExecutor(max_workers=max(len(handles), 1)) as executor:
+            futures = {
+                provider: executor.submit(deployers[provider].wait_deploy, handle)
+                for provider, handle in handles.items()
+            }
+            wait(futures.values())
+        
+        for provider, future in futures.items():
+            error = future.exception()
+            if error is None:
+                results[provider] = future.result()
+            else:
+                errors[provider] = error
+        
+        if errors:
+            raise PartialDeployError(
+                f"Deployment failed on {', '.join(errors)}"
+                f" (succeeded on {', '.join(results) or 'none'})",
+                results=results,
+                errors=errors
+            )
+        return results
+        
+    @retry_transient
     def destroy(self, provider: str, resource_id: str, config_override: Dict = None) -> bool:
         """
         Destroy deployed resources
@@ -90,15 +198,15 @@ class CloudManager:
             config_override: Optional configuration override
             
         Returns:
-            True if successful, False otherwise
-        """
-        config = self.config.get(provider, {})
-        if config_override:
-            config.update(config_override)
+            True once the resources are destroyed
             
-        deployer = CloudDeployerFactory.create_deployer(provider, config)
+        Raises:
+            DeployError: If the resources could not be destroyed
+        """
+        deployer = self._get_deployer(provider, config_override)
         return deployer.destroy(resource_id)
         
+    @retry_transient
     def get_status(self, provider: str, resource_id: str, config_override: Dict = None) -> Dict:
         """
         Get status of deployed resources
@@ -110,14 +218,14 @@ class CloudManager:
             
         Returns:
             Dictionary containing status information
-        """
-        config = self.config.get(provider, {})
-        if config_override:
-            config.update(config_override)
             
-        deployer = CloudDeployerFactory.create_deployer(provider, config)
+        Raises:
+            DeployError: If the status could not be retrieved
+        """
+        deployer = self._get_deployer(provider, config_override)
         return deployer.get_status(resource_id)
         
+    @retry_transient
     def get_logs(self, provider: str, resource_id: str, config_override: Dict = None) -> str:
         """
         Get logs from deployed service
@@ -129,10 +237,9 @@ class CloudManager:
             
         Returns:
             Log content as string
-        """
-        config = self.config.get(provider, {})
-        if config_override:
-            config.update(config_override)
             
-        deployer = CloudDeployerFactory.create_deployer(provider, config)
+        Raises:
+            DeployError: If the logs could not be retrieved
+        """
+        deployer = self._get_deployer(provider, config_override)
         return deployer.get_logs(resource_id)
@@ -1,18 +1,56 @@
-from typing import Optional, Dict
+import os
+import logging
+import threading
+from typing import Dict, Tuple
+from google.api_core import exceptions as google_exceptions
 from google.cloud import compute_v1
-from .base_deployer import BaseDeployer
+from .base_deployer import BaseDeployer, DeployError
+
+logger = logging.getLogger(__name__)
+
+# Clients keep their channels and credentials, share them per credentials file
+_CLIENT_CACHE: Dict[tuple, object] = {}
+_CLIENT_LOCK = threading.Lock()
+
+
+def _get_client(client_class):
+    """Get the process-wide instance of a compute client for the current credentials"""
+    key = (os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"), client_class.__name__)
+    with _CLIENT_LOCK:
+        client = _CLIENT_CACHE.get(key)
+        if client is None:
+            client = _CLIENT_CACHE[key] = client_class()
+        return client
+
+
+class GCPDeployError(DeployError):
+    """Raised when a GCP operation fails"""
+
+
+def _is_transient(error: Exception) -> bool:
+    return isinstance(error, (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ServerError,
+        google_exceptions.DeadlineExceeded
+    ))
 
 class GCPDeployer(BaseDeployer):
+    REQUIRED = frozenset({"project_id", "repo_url"})
+
     def __init__(self, config: Dict):
         super().__init__(config)
         self.project_id = config.get("project_id")
         self.zone = config.get("zone", "us-central1-a")
         self.machine_type = config.get("machine_type", "n1-standard-2")
-        self.instance_client = compute_v1.InstancesClient()
-        self.operation_client = compute_v1.ZoneOperationsClient()
-
-    def deploy(self) -> Optional[str]:
-        """Deploy to Google Cloud Platform"""
+        self.instance_client = _get_client(compute_v1.InstancesClient)
+        self.operation_client = _get_client(compute_v1.ZoneOperationsClient)
+        if self.project_id:
+            self._warm_up(lambda: self.instance_client.aggregated_list(
+                request=compute_v1.AggregatedListInstancesRequest(project=self.project_id, max_results=1)
+            ))
+
+    def begin_deploy(self) -> Tuple[str, str]:
+        """Start creating the GCP instance and return its name and operation name"""
         try:
             if not self.project_id:
                 raise ValueError("GCP project_id is required")
@@ -45,7 +83,7 @@ class GCPDeployer(BaseDeployer):
             metadata.items = [
                 compute_v1.Items(
                     key="startup-script",
-                    value=self._get_init_script()
+                    value=self._init_script
                 )
             ]
             instance.metadata = metadata
@@ -57,19 +95,28 @@ class GCPDeployer(BaseDeployer):
                 instance_resource=instance
             )
 
-            # Wait for the operation to complete
+            return instance.name, operation.name
+
+        except Exception as e:
+            logger.exception("Error deploying to GCP")
+            raise GCPDeployError(f"Error deploying to GCP: {e}", transient=_is_transient(e)) from e
+
+    def wait_deploy(self, handle: Tuple[str, str]) -> str:
+        """Wait for the GCP insert operation to complete"""
+        instance_name, operation_name = handle
+        try:
             self.operation_client.wait(
                 project=self.project_id,
                 zone=self.zone,
-                operation=operation.name
+                operation=operation_name
             )
 
-            print(f"GCP Instance created: {instance.name}")
-            return instance.name
+            logger.info("GCP Instance created: %s", instance_name)
+            return instance_name
 
         except Exception as e:
-            print(f"Error deploying to GCP: {str(e)}")
-            return None
+            logger.exception("Error deploying to GCP")
+            raise GCPDeployError(f"Error deploying to GCP: {e}", transient=_is_transient(e)) from e
 
     def destroy(self, instance_name: str) -> bool:
         """Destroy GCP resources"""
@@ -87,12 +134,12 @@ class GCPDeployer(BaseDeployer):
                 operation=operation.name
             )
 
-            print(f"GCP Instance deleted: {instance_name}")
+            logger.info("GCP Instance deleted: %s", instance_name)
             return True
 
         except Exception as e:
-            print(f"Error destroying GCP resources: {str(e)}")
-            return False
+            logger.exception("Error destroying GCP resources")
+            raise GCPDeployError(f"Error destroying GCP resources: {e}", transient=_is_transient(e)) from e
 
     def get_status(self, instance_name: str) -> Dict:
         """Get status of GCP deployment"""
@@ -103,8 +150,9 @@ class GCPDeployer(BaseDeployer):
                 instance=instance_name
             )
 
-            network_interface = instance.network_interfaces[0]
-            public_ip = network_interface.access_configs[0].nat_ip if network_interface.access_configs else None
+            public_ip = None
+            if instance.network_interfaces and instance.network_interfaces[0].access_configs:
+                public_ip = instance.network_interfaces[0].access_configs[0].nat_ip
 
             return {
                 "status": instance.status,
@@ -115,8 +163,8 @@ class GCPDeployer(BaseDeployer):
             }
 
         except Exception as e:
-            print(f"Error getting GCP status: {str(e)}")
-            return {"status": "error", "message": str(e)}
+            logger.exception("Error getting GCP status")
+            raise GCPDeployError(f"Error getting GCP status: {e}", transient=_is_transient(e)) from e
 
     def get_logs(self, instance_name: str) -> str:
         """Get logs from GCP instance"""
@@ -130,10 +178,5 @@ class GCPDeployer(BaseDeployer):
             return output.contents
 
         except Exception as e:
-            print(f"Error getting GCP logs: {str(e)}")
-            return f"Error retrieving logs: {str(e)}"
-
-    def validate_config(self) -> bool:
-        """Validate GCP configuration"""
-        required_fields = ["project_id", "repo_url"]
-        return all(field in self.config for field in required_fields)
+            logger.exception("Error getting GCP logs")
+            raise GCPDeployError(f"Error getting GCP logs: {e}", transient=_is_transient(e)) from e
@@ -0,0 +1,31 @@
+import unittest
+from unittest import mock
+
+from ipfs_api import IPFSAPIClient
+
+
+class IPFSAPIClientAddTest(unittest.TestCase):
+    def setUp(self):
+        self.client = IPFSAPIClient(api_url="http://ipfs.test/api/v0")
+        self.client.session = mock.Mock()
+        self.client.session.post.return_value.json.return_value = {"Name": "content.txt", "Hash": "QmTest"}
+
+    def test_add_str_posts_content(self):
+        self.client.connected = True
+
+        self.assertEqual(self.client.add_str("hello"), "QmTest")
+
+        self.client.session.post.assert_called_once_with(
+            "http://ipfs.test/api/v0/add",
+            files={"file": ("content.txt", b"hello")}
+        )
+        self.client.session.post.return_value.raise_for_status.assert_called_once_with()
+
+    def test_add_str_requires_connection(self):
+        with self.assertRaises(ConnectionError):
+            self.client.add_str("hello")
+        self.client.session.post.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
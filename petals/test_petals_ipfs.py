@@ -1,23 +1,37 @@
-import requests
-import json
+import asyncio
+import httpx
+import orjson
 import time
-import base64
-from PIL import Image
-import io
 import os
+import re
 
 # Configuration
 BASE_URL = "http://localhost:8000"
 CACHE_DIR = "./test_results"
 
+# Shared async client so every request reuses a pooled keep-alive connection, set in main()
+CLIENT = None
+CLIENT_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=8)
+# Generation can take minutes, only connecting should fail fast
+CLIENT_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Characters not allowed in file names built from prompts
+_SAFE_RE = re.compile(r"[^A-Za-z0-9 _-]")
+
 # Create cache directory if it doesn't exist
 os.makedirs(CACHE_DIR, exist_ok=True)
 
-def check_service_status():
+def _json(response):
+    """Decode a JSON response body with orjson"""
+    return orjson.loads(response.content)
+
+async def check_service_status():
     """Check if the service is running and what components are available"""
-    response = requests.get(f"{BASE_URL}/status")
+    response = await CLIENT.get(f"{BASE_URL}/status")
     if response.status_code == 200:
-        status = response.json()
+        status = _json(response)
         print("\n=== Service Status ===")
         print(f"Text Model: {status['text_model']['name']}")
         print(f"  - Loaded: {status['text_model']['loaded']}")
@@ -34,7 +48,21 @@ def check_service_status():
         print(response.text)
         return None
 
-def generate_text(prompt, max_length=100, temperature=0.7, store_on_ipfs=True):
+async def wait_for_models(timeout=600, initial_delay=2, max_delay=30):
+    """Poll the status endpoint with exponential backoff until both models are loaded"""
+    status = None
+    delay = initial_delay
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(delay)
+        status = await check_service_status()
+        if status and status["text_model"]["loaded"] and status["image_model"]["loaded"]:
+            print("All models loaded!")
+            return status
+        delay = min(delay * 2, max_delay)
+    return status
+
+async def generate_text(prompt, max_length=100, temperature=0.7, store_on_ipfs=True):
     """Generate text using the Petals distributed model"""
     print(f"\n=== Generating Text ===")
     print(f"Prompt: {prompt}")
@@ -46,9 +74,9 @@ def generate_text(prompt, max_length=100, temperature=0.7, store_on_ipfs=True):
         "store_on_ipfs": store_on_ipfs
     }
     
-    response = requests.post(f"{BASE_URL}/generate/text", json=payload)
+    response = await CLIENT.post(f"{BASE_URL}/generate/text", content=orjson.dumps(payload), headers=JSON_HEADERS)
     if response.status_code == 200:
-        result = response.json()
+        result = _json(response)
         print("\nGenerated Text:")
         print(result["generated_text"])
         
@@ -63,7 +91,7 @@ def generate_text(prompt, max_length=100, temperature=0.7, store_on_ipfs=True):
         print(response.text)
         return None
 
-def generate_image(prompt, negative_prompt="", width=512, height=512, 
+async def generate_image(prompt, negative_prompt="", width=512, height=512, 
                   steps=30, guidance_scale=7.5, store_on_ipfs=True):
     """Generate an image using Stable Diffusion"""
     print(f"\n=== Generating Image ===")
@@ -79,67 +107,75 @@ def generate_image(prompt, negative_prompt="", width=512, height=512,
         "store_on_ipfs": store_on_ipfs
     }
     
-    response = requests.post(f"{BASE_URL}/generate/image", json=payload)
-    if response.status_code == 200:
-        result = response.json()
+    # Ask for the raw image and stream it straight to disk
+    async with CLIENT.stream("POST", f"{BASE_URL}/generate/image", params={"format": "binary"},
+                             content=orjson.dumps(payload), headers=JSON_HEADERS) as response:
+        if response.status_code != 200:
+            await response.aread()
+            print(f"Error generating image: {response.status_code}")
+            print(response.text)
+            return None, None
         
-        # Save the image
-        image_data = base64.b64decode(result["image_base64"])
-        image = Image.open(io.BytesIO(image_data))
+        image_format = response.headers.get("X-Image-Format", "png")
         
         # Create a filename based on the prompt
-        safe_prompt = "".join(x for x in prompt[:30] if x.isalnum() or x in " _-").strip()
-        safe_prompt = safe_prompt.replace(" ", "_")
-        filename = f"{CACHE_DIR}/{safe_prompt}_{int(time.time())}.png"
-        image.save(filename)
-        
-        print(f"Image saved to: {filename}")
-        
-        if "ipfs_hash" in result:
-            print(f"\nStored on IPFS:")
-            print(f"  - Hash: {result['ipfs_hash']}")
-            print(f"  - Gateway URL: {result['ipfs_gateway_url']}")
-        
-        return result, filename
-    else:
-        print(f"Error generating image: {response.status_code}")
-        print(response.text)
-        return None, None
+        safe_prompt = _SAFE_RE.sub("", prompt[:30]).strip().replace(" ", "_")
+        filename = f"{CACHE_DIR}/{safe_prompt}_{int(time.time())}.{image_format}"
+        with open(filename, "wb") as f:
+            async for chunk in response.aiter_bytes():
+                f.write(chunk)
+    
+    print(f"Image saved to: {filename}")
+    
+    result = {"image_format": image_format}
+    if "X-IPFS-Hash" in response.headers:
+        result["ipfs_hash"] = response.headers["X-IPFS-Hash"]
+        result["ipfs_gateway_url"] = response.headers["X-IPFS-Gateway-URL"]
+        print(f"\nStored on IPFS:")
+        print(f"  - Hash: {result['ipfs_hash']}")
+        print(f"  - Gateway URL: {result['ipfs_gateway_url']}")
+    
+    return result, filename
 
-def get_from_ipfs(ipfs_hash):
+async def get_from_ipfs(ipfs_hash):
     """Retrieve content from IPFS"""
     print(f"\n=== Retrieving from IPFS ===")
     print(f"IPFS Hash: {ipfs_hash}")
     
-    response = requests.get(f"{BASE_URL}/ipfs/get/{ipfs_hash}")
-    if response.status_code == 200:
+    # Stream the body so large binaries go to disk in chunks instead of memory
+    async with CLIENT.stream("GET", f"{BASE_URL}/ipfs/get/{ipfs_hash}") as response:
+        if response.status_code != 200:
+            await response.aread()
+            print(f"Error retrieving from IPFS: {response.status_code}")
+            print(response.text)
+            return None
+        
         # Check if it's JSON (text) or binary (image)
         content_type = response.headers.get("content-type", "")
         
         if "application/json" in content_type:
-            result = response.json()
+            await response.aread()
+            result = _json(response)
             print(f"Retrieved text content:")
             print(result["content"])
             return result
-        else:
-            # It's binary data (likely an image)
-            filename = f"{CACHE_DIR}/retrieved_{ipfs_hash}.png"
-            with open(filename, "wb") as f:
-                f.write(response.content)
-            print(f"Retrieved binary content saved to: {filename}")
-            return filename
-    else:
-        print(f"Error retrieving from IPFS: {response.status_code}")
-        print(response.text)
-        return None
+        
+        # It's binary data, name the file after its image type when known
+        extension = content_type.split(";")[0].split("/")[-1] if content_type.startswith("image/") else "bin"
+        filename = f"{CACHE_DIR}/retrieved_{ipfs_hash}.{extension}"
+        with open(filename, "wb") as f:
+            async for chunk in response.aiter_bytes(1 << 16):
+                f.write(chunk)
+        print(f"Retrieved binary content saved to: {filename}")
+        return filename
 
-def get_peers_info():
+async def get_peers_info():
     """Get information about connected Petals peers"""
     print(f"\n=== Petals Network Peers ===")
     
-    response = requests.get(f"{BASE_URL}/peers")
+    response = await CLIENT.get(f"{BASE_URL}/peers")
     if response.status_code == 200:
-        result = response.json()
+        result = _json(response)
         print(f"Connected to {result['peers_count']} peers for {result['model_name']}")
         for i, peer in enumerate(result['peers']):
             print(f"Peer {i+1}: {peer}")
@@ -149,56 +185,58 @@ def get_peers_info():
         print(response.text)
         return None
 
-def main():
+async def main():
     """Run a demonstration of the Petals-IPFS service"""
+    global CLIENT
     print("=== Petals-IPFS Service Demo ===")
     
-    # Check service status
-    status = check_service_status()
-    if not status:
-        print("Service is not available. Make sure it's running.")
-        return
-    
-    # Wait for models to load if needed
-    if not status["text_model"]["loaded"] or not status["image_model"]["loaded"]:
-        print("\nWaiting for models to load (this may take a few minutes)...")
-        for _ in range(10):
-            time.sleep(30)  # Check every 30 seconds
-            status = check_service_status()
-            if status["text_model"]["loaded"] and status["image_model"]["loaded"]:
-                print("All models loaded!")
-                break
-    
-    # Get information about Petals peers
-    peers_info = get_peers_info()
-    
-    # Generate text with Petals
-    text_result = generate_text(
-        prompt="The future of artificial intelligence is",
-        max_length=150,
-        temperature=0.8,
-        store_on_ipfs=True
-    )
-    
-    # Generate an image with Stable Diffusion
-    image_result, image_path = generate_image(
-        prompt="A futuristic city with flying cars and holographic displays",
-        negative_prompt="blurry, low quality",
-        width=512,
-        height=512,
-        steps=30,
-        store_on_ipfs=True
-    )
-    
-    # Retrieve content from IPFS
-    if text_result and "ipfs_hash" in text_result:
-        retrieved_text = get_from_ipfs(text_result["ipfs_hash"])
-    
-    if image_result and "ipfs_hash" in image_result:
-        retrieved_image = get_from_ipfs(image_result["ipfs_hash"])
+    async with httpx.AsyncClient(limits=CLIENT_LIMITS, timeout=CLIENT_TIMEOUT) as client:
+        CLIENT = client
+        
+        # Check service status
+        status = await check_service_status()
+        if not status:
+            print("Service is not available. Make sure it's running.")
+            return
+        
+        # Wait for models to load if needed
+        if not status["text_model"]["loaded"] or not status["image_model"]["loaded"]:
+            print("\nWaiting for models to load (this may take a few minutes)...")
+            await wait_for_models()
+        
+        # Get information about Petals peers
+        peers_info = await get_peers_info()
+        
+        # Generate text with Petals and an image with Stable Diffusion concurrently
+        text_result, (image_result, image_path) = await asyncio.gather(
+            generate_text(
+                prompt="The future of artificial intelligence is",
+                max_length=150,
+                temperature=0.8,
+                store_on_ipfs=True
+            ),
+            generate_image(
+                prompt="A futuristic city with flying cars and holographic displays",
+                negative_prompt="blurry, low quality",
+                width=512,
+                height=512,
+                steps=30,
+                store_on_ipfs=True
+            )
+        )
+        
+        # Retrieve content from IPFS, both fetches run concurrently
+        fetches = []
+        if text_result and "ipfs_hash" in text_result:
+            fetches.append(get_from_ipfs(text_result["ipfs_hash"]))
+        
+        if image_result and "ipfs_hash" in image_result:
+            fetches.append(get_from_ipfs(image_result["ipfs_hash"]))
+        
+        await asyncio.gather(*fetches)
     
     print("\n=== Demo Complete ===")
     print("You've successfully tested the Petals-IPFS service!")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+import errno
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+from wallet import WalletManager
+
+
+def _sign(account, message):
+    return account.sign_message(encode_defunct(text=message)).signature
+
+
+class WalletLogRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        self.account = Account.create()
+
+    def _register(self, manager, message):
+        return manager.register_instance(_sign(self.account, message), message, self.account.address)
+
+    def test_torn_tail_is_dropped_before_new_records(self):
+        manager = WalletManager(self.config_dir)
+        first = self._register(manager, "first")
+        manager.flush()
+
+        # A crash mid-write leaves half a record at the end of the log
+        with open(manager.log_file, 'ab') as f:
+            f.write(b'{"op":"add","id":"0x')
+
+        manager = WalletManager(self.config_dir)
+        self.assertTrue(manager.verify_instance(first))
+        second = self._register(manager, "second")
+        manager.flush()
+
+        manager = WalletManager(self.config_dir)
+        self.assertTrue(manager.verify_instance(first))
+        self.assertTrue(manager.verify_instance(second))
+        self.assertEqual(manager.instance_count, 2)
+
+    def test_failed_flush_keeps_events(self):
+        manager = WalletManager(self.config_dir)
+        first = self._register(manager, "first")
+        manager.flush()
+        second = self._register(manager, "second")
+
+        log_size = os.path.getsize(manager.log_file)
+        manager._log_fh.close()
+        manager._log_fh = mock.Mock()
+        manager._log_fh.tell.return_value = log_size
+        manager._log_fh.write.side_effect = OSError(errno.ENOSPC, "No space left on device")
+        with self.assertRaises(OSError):
+            manager.flush()
+        self.assertEqual(len(manager._pending), 1)
+
+        manager.flush()
+        manager = WalletManager(self.config_dir)
+        self.assertTrue(manager.verify_instance(first))
+        self.assertTrue(manager.verify_instance(second))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,75 +1,402 @@
-from eth_account import Account
-from eth_account.messages import encode_defunct
-from web3 import Web3
-import json
 import os
+from eth_account import Account
+from eth_utils import to_checksum_address
+import asyncio
+import atexit
+import cbor2
+import orjson
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
 from pathlib import Path
 
+# Keccak-256 for instance IDs straight from the C primitive, skipping eth-hash's backend dispatch.
+# hashlib.sha3_256 is the NIST variant with different padding, so it can't stand in here.
+try:
+    from sha3 import keccak_256  # pysha3
+
+    def _id_hash(data):
+        return keccak_256(data).digest()
+except ImportError:
+    from Crypto.Hash import keccak  # pycryptodome, installed with eth-hash
+
+    def _id_hash(data):
+        return keccak.new(data=data, digest_bits=256).digest()
+
+# Fold the mutation log into the snapshot once it holds this many records
+COMPACT_THRESHOLD = 1000
+
+# Recently registered requests remembered so exact resubmissions skip verification
+SEEN_CACHE_SIZE = 10000
+
+# Memoized verify_instance results, keyed by instance ID and mutation epoch
+VERIFY_CACHE_SIZE = 65536
+
+# Recovered signers remembered so resubmissions skip ecrecover
+RECOVER_CACHE_SIZE = 4096
+
+# Threads in the signature verification pool
+VERIFY_POOL_WORKERS = 2
+
+# Seconds a fetched block timestamp is reused for new registrations
+BLOCK_TIMESTAMP_TTL = 2.0
+
+# Bound once instead of resolving it through Account or a Web3 instance on every call
+_recover_hash = Account._recover_hash
+
+# (signature, message hash) -> recovered address, least recently used first
+_RECOVERED = OrderedDict()
+_RECOVERED_LOCK = threading.Lock()
+
+def _recover_signer(signature, message_hash):
+    """Recover the signer of an EIP-191 message hash (also what the verification pool runs)"""
+    return _recover_hash(message_hash, signature=signature)
+
+def _cached_signer(key):
+    """Previously recovered signer for a (signature, message hash) key, or None"""
+    with _RECOVERED_LOCK:
+        address = _RECOVERED.get(key)
+        if address is not None:
+            _RECOVERED.move_to_end(key)
+        return address
+
+def _remember_signer(key, address):
+    """Cache a recovered signer, dropping the least recently used one when full"""
+    with _RECOVERED_LOCK:
+        _RECOVERED[key] = address
+        if len(_RECOVERED) > RECOVER_CACHE_SIZE:
+            _RECOVERED.popitem(last=False)
+
+def _recover(signature, message_hash):
+    """Recover the signer of an EIP-191 message hash, cached so resubmissions skip ecrecover"""
+    key = (signature, message_hash)
+    address = _cached_signer(key)
+    if address is None:
+        address = _recover_signer(signature, message_hash)
+        _remember_signer(key, address)
+    return address
+
+# Async registrations run ecrecover on these threads, off the event loop. With the
+# coincurve backend eth-keys does the curve math in C without holding the GIL.
+_VERIFY_POOL = None
+
+def start_verify_pool(max_workers=VERIFY_POOL_WORKERS):
+    """Start the signature verification pool used by register_instance_async"""
+    global _VERIFY_POOL
+    if _VERIFY_POOL is None:
+        _VERIFY_POOL = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wallet-verify")
+    return _VERIFY_POOL
+
+def shutdown_verify_pool():
+    """Stop the signature verification pool, async registrations then verify inline"""
+    global _VERIFY_POOL
+    pool, _VERIFY_POOL = _VERIFY_POOL, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+EIP191_PREFIX = b"\x19Ethereum Signed Message:\n"
+
+def _message_hash(message):
+    """EIP-191 personal_sign digest of a text message, built directly instead of via encode_defunct"""
+    message_bytes = message.encode()
+    return _id_hash(EIP191_PREFIX + str(len(message_bytes)).encode() + message_bytes)
+
+def _id_bytes(instance_id):
+    """Internal 32-byte form of a 0x-prefixed hex instance ID (None if malformed)"""
+    if isinstance(instance_id, bytes):
+        return instance_id
+    try:
+        return bytes.fromhex(instance_id[2:] if instance_id.startswith("0x") else instance_id)
+    except (ValueError, AttributeError):
+        return None
+
+def _id_hex(instance_id):
+    """Public 0x-prefixed hex form of an internal instance ID"""
+    return "0x" + instance_id.hex()
+
 class WalletManager:
+    # Seconds to wait after a mutation before writing, so bursts of registrations hit disk once
+    SAVE_DELAY = 1.0
+
     def __init__(self, config_path="./config"):
         self.config_path = Path(config_path)
         self.config_path.mkdir(parents=True, exist_ok=True)
-        self.wallets_file = self.config_path / "wallets.json"
-        self.web3 = Web3()
+        self.wallets_file = self.config_path / "wallets.cbor"
+        # Snapshot format before CBOR, migrated on first load
+        self.legacy_wallets_file = self.config_path / "wallets.json"
+        self.log_file = self.config_path / "wallets.log"
+        self._log_fh = None  # append handle, opened on first flush
+        self._ts_cache = (0.0, 0)  # (monotonic time fetched, block timestamp)
+        self._pending = []
+        self._seen = OrderedDict()  # request key -> instance ID, least recently used first
+        self._save_timer = None
+        self._save_lock = threading.Lock()
+        # Bumped after every mutation so memoized verify results from before it go unused
+        self._epoch = 0
+        self._verify_cached = lru_cache(maxsize=VERIFY_CACHE_SIZE)(self._lookup_active)
         self._load_wallets()
+        atexit.register(self.flush)
 
     def _load_wallets(self):
-        """Load registered wallets from file"""
-        if self.wallets_file.exists():
-            with open(self.wallets_file, 'r') as f:
-                self.wallets = json.load(f)
+        """Load the wallets snapshot and replay the mutation log on top of it"""
+        snapshot_exists = self.wallets_file.exists()
+        migrate = not snapshot_exists and self.legacy_wallets_file.exists()
+        if snapshot_exists:
+            with open(self.wallets_file, 'rb') as f:
+                wallets = cbor2.load(f)
+        elif migrate:
+            wallets = orjson.loads(self.legacy_wallets_file.read_bytes())
         else:
-            self.wallets = {}
-            self._save_wallets()
+            wallets = {}
 
-    def _save_wallets(self):
-        """Save wallets to file"""
-        with open(self.wallets_file, 'w') as f:
-            json.dump(self.wallets, f, indent=2)
+        self._log_records = 0
+        if self.log_file.exists():
+            good_offset = 0
+            torn = False
+            with open(self.log_file, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated record")
+                        event = orjson.loads(line)
+                    except ValueError:
+                        # Only the last record can be incomplete, from a crash mid-write
+                        torn = True
+                        break
+                    self._apply_event(wallets, event)
+                    self._log_records += 1
+                    good_offset += len(line)
+            if torn:
+                # Cut the fragment off, otherwise the next append would be glued onto it
+                os.truncate(self.log_file, good_offset)
 
-    def register_instance(self, signature, message, address):
-        """Register a new training instance with a wallet signature"""
-        # Verify the signature
-        message_hash = encode_defunct(text=message)
-        recovered_address = self.web3.eth.account.recover_message(message_hash, signature=signature)
-        
-        if recovered_address.lower() != address.lower():
+        # Instance IDs are kept as raw bytes and addresses lowercased, older records are
+        # normalized here. The active flag verify_instance reads is kept apart from the
+        # rest of each record, and the address -> instance IDs index is rebuilt, never saved.
+        self._active = {}
+        self._meta = {}
+        self._by_address = {}
+        for instance_id, info in wallets.items():
+            instance_id = _id_bytes(instance_id)
+            self._active[instance_id] = info.pop("active")
+            info["address"] = info["address"].lower()
+            self._meta[instance_id] = info
+            self._by_address.setdefault(info["address"], set()).add(instance_id)
+
+        if not snapshot_exists or self._log_records > COMPACT_THRESHOLD:
+            self._compact()
+        if migrate:
+            # The CBOR snapshot now holds everything the JSON file did
+            self.legacy_wallets_file.unlink()
+
+    @staticmethod
+    def _apply_event(wallets, event):
+        """Apply one mutation log record to loaded wallet records"""
+        instance_id = _id_bytes(event["id"])
+        if event["op"] == "add":
+            wallets[instance_id] = event["data"]
+        elif event["op"] == "deactivate":
+            wallets[instance_id]["active"] = False
+
+    def _append_event(self, event):
+        """Queue a mutation for the log, written shortly afterwards (caller holds _save_lock)"""
+        self._pending.append(event)
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.SAVE_DELAY, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Append pending mutations to the log in one write"""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._pending:
+                return
+            events, self._pending = self._pending, []
+            if self._log_fh is None:
+                self._log_fh = open(self.log_file, 'ab')
+            offset = self._log_fh.tell()
+            try:
+                # The buffered writer retries short writes until every byte is out
+                self._log_fh.write(b"".join(orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE) for event in events))
+                self._log_fh.flush()
+            except OSError:
+                # Drop whatever made it to disk and keep the events for the next flush
+                self._discard_log_fh()
+                try:
+                    os.truncate(self.log_file, offset)
+                except OSError:
+                    pass
+                self._pending = events
+                raise
+            self._log_records += len(events)
+            if self._log_records >= COMPACT_THRESHOLD:
+                self._compact()
+
+    def _discard_log_fh(self):
+        """Close the log handle after a failed write, without flushing its buffer again"""
+        fh, self._log_fh = self._log_fh, None
+        try:
+            # Closing the raw file makes the buffered writer's own close a no-op
+            fh.raw.close()
+        except (OSError, ValueError):
+            pass
+
+    def _compact(self):
+        """Write all wallets to a fresh snapshot and truncate the log"""
+        tmp_file = self.wallets_file.with_suffix(".cbor.tmp")
+        with open(tmp_file, 'wb') as f:
+            # Saved as whole records, the split storage is only in memory
+            cbor2.dump({
+                instance_id: {**meta, "active": self._active[instance_id]}
+                for instance_id, meta in self._meta.items()
+            }, f)
+            # The snapshot must be on disk before the log it replaces is truncated
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.wallets_file)
+        if self._log_fh is not None:
+            self._log_fh.close()
+            self._log_fh = None
+        open(self.log_file, 'wb').close()
+        self._log_records = 0
+
+    @cached_property
+    def web3(self):
+        """Web3 client, only needed for block timestamps so built (and imported) on first use"""
+        from web3 import Web3
+        return Web3()
+
+    def _now_block_ts(self):
+        """Latest block timestamp, cached briefly so bursts of registrations share one RPC"""
+        cached_at, timestamp = self._ts_cache
+        now = time.monotonic()
+        if now - cached_at < BLOCK_TIMESTAMP_TTL:
+            return timestamp
+
+        try:
+            timestamp = self.web3.eth.get_block('latest').timestamp
+        except Exception:
+            # No provider or node reachable, fall back to local time
+            timestamp = int(time.time())
+        self._ts_cache = (now, timestamp)
+        return timestamp
+
+    def _seen_instance(self, seen_key):
+        """Instance ID of an identical request that was already verified, if still active"""
+        instance_id = self._seen.get(seen_key)
+        if instance_id is not None and self._active.get(instance_id):
+            self._seen.move_to_end(seen_key)
+            return _id_hex(instance_id)
+        return None
+
+    def _store_instance(self, seen_key, recovered_address, message, address):
+        """Check the recovered signer and record the new instance"""
+        addr = address.lower()
+        if recovered_address.lower() != addr:
             raise ValueError("Invalid signature")
 
-        # Generate instance ID
-        instance_id = self.web3.keccak(text=f"{address}-{message}").hex()
+        # Generate instance ID (from the address as given, so IDs stay stable)
+        instance_id = _id_hash(f"{address}-{message}".encode())
         
         # Store instance details
-        self.wallets[instance_id] = {
-            "address": address,
-            "registered_at": self.web3.eth.get_block('latest').timestamp,
-            "active": True
+        meta = {
+            "address": addr,
+            "registered_at": self._now_block_ts()
         }
-        self._save_wallets()
+        with self._save_lock:
+            self._meta[instance_id] = meta
+            self._active[instance_id] = True
+            self._by_address.setdefault(addr, set()).add(instance_id)
+            self._append_event({"op": "add", "id": _id_hex(instance_id), "data": {**meta, "active": True}})
+            self._epoch += 1
+            self._seen[seen_key] = instance_id
+            if len(self._seen) > SEEN_CACHE_SIZE:
+                self._seen.popitem(last=False)
         
-        return instance_id
+        return _id_hex(instance_id)
+
+    def register_instance(self, signature, message, address):
+        """Register a new training instance with a wallet signature"""
+        # An identical request that was already verified returns its instance directly.
+        # The signature is part of the key so a hit never skips checking a new signature.
+        seen_key = _id_hash(f"{address}|{message}|{signature}".encode())
+        instance_id = self._seen_instance(seen_key)
+        if instance_id is not None:
+            return instance_id
+
+        # Verify the signature
+        message_hash = _message_hash(message)
+        recovered_address = _recover(signature, message_hash)
+        return self._store_instance(seen_key, recovered_address, message, address)
+
+    async def register_instance_async(self, signature, message, address):
+        """Register a new training instance, recovering the signer in the verification pool"""
+        seen_key = _id_hash(f"{address}|{message}|{signature}".encode())
+        instance_id = self._seen_instance(seen_key)
+        if instance_id is not None:
+            return instance_id
+
+        message_hash = _message_hash(message)
+        key = (signature, message_hash)
+        recovered_address = _cached_signer(key)
+        if recovered_address is None:
+            if _VERIFY_POOL is None:
+                recovered_address = _recover_signer(signature, message_hash)
+            else:
+                recovered_address = await asyncio.get_running_loop().run_in_executor(
+                    _VERIFY_POOL, _recover_signer, signature, message_hash
+                )
+            _remember_signer(key, recovered_address)
+        # Wallet state is only touched back on the calling thread
+        return self._store_instance(seen_key, recovered_address, message, address)
+
+    def _lookup_active(self, instance_id, epoch):
+        """Whether an instance is registered and active (epoch only keys the memo)"""
+        return self._active.get(_id_bytes(instance_id), False)
 
     def verify_instance(self, instance_id):
         """Verify if an instance is registered and active"""
-        if instance_id not in self.wallets:
-            return False
-        return self.wallets[instance_id]["active"]
+        return self._verify_cached(instance_id, self._epoch)
 
     def deactivate_instance(self, instance_id, signature, address):
         """Deactivate a training instance"""
-        if instance_id not in self.wallets:
+        instance_id = _id_bytes(instance_id)
+        if instance_id not in self._active:
             raise ValueError("Instance not found")
             
-        if self.wallets[instance_id]["address"].lower() != address.lower():
+        if instance_id not in self._by_address.get(address.lower(), ()):
             raise ValueError("Not authorized")
             
-        self.wallets[instance_id]["active"] = False
-        self._save_wallets()
+        with self._save_lock:
+            self._active[instance_id] = False
+            self._append_event({"op": "deactivate", "id": _id_hex(instance_id)})
+            self._epoch += 1
         
         return True
 
+    def get_instances_for_address(self, address):
+        """Get the IDs of all instances registered by an address"""
+        return {_id_hex(instance_id) for instance_id in self._by_address.get(address.lower(), ())}
+
     def get_instance_info(self, instance_id):
         """Get information about a registered instance"""
-        if instance_id not in self.wallets:
+        instance_id = _id_bytes(instance_id)
+        if instance_id not in self._meta:
             raise ValueError("Instance not found")
-        return self.wallets[instance_id]
+        meta = self._meta[instance_id]
+        # Stored lowercased, shown in checksum form
+        return {
+            **meta,
+            "active": self._active[instance_id],
+            "address": to_checksum_address(meta["address"])
+        }
+
+    @property
+    def instance_count(self):
+        """Number of registered instances, active or not"""
+        return len(self._active)